@@ -0,0 +1,304 @@
+"""Measures the Python side of make_trays.py: planning, scheduling and
+bookkeeping, with OpenSCAD replaced by a stub that writes a few fixed
+bytes (after an optional sleep).  Run it from anywhere:
+
+    python bench/bench_pipeline.py
+    python bench/bench_pipeline.py --sizes 10 1000 100000 --save before.json
+    python bench/bench_pipeline.py --compare before.json
+
+For each config size it reports the time to plan the build (--count_only),
+the time to run it with -j 1 and the overhead per job beyond the stub's own
+run time, the peak memory of make_trays.py, and how the run time scales with
+--jobs.  With --compare it exits with an error when a measurement is more
+than --tolerance times the saved one, so it can guard against regressions.
+
+It also times the planning commands (--count_only, --list_plan and
+--dryrun) on example_config.yaml, with nothing cached about OpenSCAD, and
+exits with an error when one takes longer than --plan_budget.  That is the
+time make_trays spends importing and planning, without Python's own start
+up.  The stub is a shell script, so this runs on Linux and macOS."""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+stub_openscad = """#!/bin/sh
+out=""
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --version) echo "OpenSCAD version 2021.01" >&2; exit 0 ;;
+        -o) out="$2"; shift ;;
+    esac
+    shift
+done
+if [ -n "$STUB_SLEEP" ]; then sleep "$STUB_SLEEP"; fi
+if [ -n "$out" ]; then printf 'solid stub\\nendsolid stub\\n' > "$out"; fi
+"""
+
+
+# Times the import of make_trays and the planning in-process, with the
+# startup cache moved aside so OpenSCAD isn't known yet.
+plan_driver = """
+import sys, time
+start = time.perf_counter()
+import make_trays
+make_trays.startup_cache_file = sys.argv.pop(1)
+make_trays.get_oscad_variables()
+try:
+    make_trays.MakeTrays().make()
+except SystemExit:
+    pass
+print(f"Planned in: {time.perf_counter() - start}")
+"""
+
+
+def make_stub(folder):
+    path = os.path.join(folder, "openscad")
+    with open(path, "w") as f:
+        f.write(stub_openscad)
+    os.chmod(path, 0o755)
+    return path
+
+
+def make_config(folder, size):
+    # Distinct simple trays (no two the same when turned round), so every
+    # object is its own render.
+    sizes = [
+        (length, width) for length in range(1, 51) for width in range(1, length + 1)
+    ]
+    dimensions = []
+    for i in range(size):
+        length, width = sizes[i % len(sizes)]
+        height = round(1 + (i // len(sizes)) * 0.05, 2)
+        dimensions += [f"{length}x{width}x{height}"]
+    config = {
+        "output_folder": os.path.join(folder, f"out_{size}"),
+        "skip_thumbnails": True,
+        "generators": {"bench": {"dimensions": " ".join(dimensions)}},
+    }
+    path = os.path.join(folder, f"config_{size}.json")
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return path, config["output_folder"]
+
+
+def run(args, stub_folder, sleep=None):
+    # make_trays.py with the stub first on the PATH.  Returns the wall time,
+    # the peak memory in MB, and the number of objects declared.
+    env = dict(os.environ)
+    env["PATH"] = stub_folder + os.pathsep + env["PATH"]
+    if sleep:
+        env["STUB_SLEEP"] = str(sleep)
+    start = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, "make_trays.py"] + args,
+        cwd=repo,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    output = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.time() - start
+    if status != 0:
+        sys.exit(f"make_trays.py {' '.join(args)} failed:\n{output[-2000:]}")
+    max_rss = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    match = re.search(r"Number of objects declared:\s+(\d+)", output)
+    return wall, max_rss, int(match.group(1)) if match else 0
+
+
+def bench(size, folder, stub_folder, options):
+    config, output = make_config(folder, size)
+    result = {"size": size}
+
+    wall, rss, objects = run(["-c", config, "--count_only"], stub_folder)
+    result["objects"] = objects
+    result["plan_seconds"] = round(wall, 3)
+    result["plan_max_rss_mb"] = round(rss, 1)
+
+    if size > options.max_run_size:
+        return result
+
+    # Sleeping in the stub makes the scheduler's share easy to separate out.
+    sleep = options.stub_sleep
+    wall, rss, objects = run(
+        ["-c", config, "--doit", "-j", "1"], stub_folder, sleep=sleep
+    )
+    result["run_seconds"] = round(wall, 3)
+    result["run_max_rss_mb"] = round(rss, 1)
+    result["overhead_ms_per_job"] = round(
+        max(wall - result["plan_seconds"] - objects * sleep, 0) / objects * 1000, 3
+    )
+
+    result["jobs_scaling"] = {}
+    for jobs in options.jobs:
+        shutil.rmtree(output, ignore_errors=True)
+        wall, _, _ = run(
+            ["-c", config, "--doit", "-j", str(jobs)], stub_folder, sleep=sleep
+        )
+        result["jobs_scaling"][str(jobs)] = round(wall, 3)
+    shutil.rmtree(output, ignore_errors=True)
+    return result
+
+
+def time_planning(folder, stub_folder, options):
+    # The median time of each planning command, in seconds.
+    env = dict(os.environ)
+    env["PATH"] = stub_folder + os.pathsep + env["PATH"]
+    output = os.path.join(folder, "plan_out")
+    times = {}
+    for option in ["--count_only", "--list_plan", "--dryrun"]:
+        runs = []
+        for i in range(options.plan_repeats):
+            cache = os.path.join(folder, f"startup_cache_{option[2:]}_{i}.json")
+            proc = subprocess.run(
+                [sys.executable, "-c", plan_driver, cache]
+                + ["-c", "example_config.yaml", "-o", output, option],
+                cwd=repo,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            )
+            match = re.search(r"Planned in: (\S+)", proc.stdout)
+            if not match:
+                sys.exit(f"make_trays.py {option} failed:\n{proc.stdout[-2000:]}")
+            runs += [float(match.group(1))]
+        times[option] = round(sorted(runs)[len(runs) // 2], 3)
+    return times
+
+
+def print_header():
+    print(
+        f"{'objects':>8} {'plan s':>8} {'plan MB':>8} {'run s':>8} {'run MB':>8} {'ms/job':>8}  --jobs scaling (s)"
+    )
+
+
+def print_result(r):
+    scaling = " ".join(f"{j}:{s}" for j, s in r.get("jobs_scaling", {}).items())
+    print(
+        f"{r['objects']:>8} {r['plan_seconds']:>8} {r['plan_max_rss_mb']:>8} {r.get('run_seconds', '-'):>8} {r.get('run_max_rss_mb', '-'):>8} {r.get('overhead_ms_per_job', '-'):>8}  {scaling}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    # Times and memory only; anything under 0.2s is too noisy to judge.
+    regressions = []
+    saved = {r["size"]: r for r in baseline}
+    for r in results:
+        if r["size"] not in saved:
+            continue
+        for field in ["plan_seconds", "run_seconds", "plan_max_rss_mb"]:
+            old, new = saved[r["size"]].get(field), r.get(field)
+            if old is None or new is None:
+                continue
+            if field.endswith("seconds") and new < 0.2:
+                continue
+            if new > old * tolerance:
+                regressions += [f"{r['size']} objects: {field} {old} -> {new}"]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 1000, 100000],
+        help="The number of trays in each synthetic config.",
+    )
+    parser.add_argument(
+        "--max_run_size",
+        type=int,
+        default=1000,
+        help="Only plan the configs larger than this; running them with a stub process per object takes too long.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="The --jobs values to measure the scaling of the run with.",
+    )
+    parser.add_argument(
+        "--stub_sleep",
+        type=float,
+        default=0.01,
+        help="How long the stub OpenSCAD takes per object, in seconds.",
+    )
+    parser.add_argument(
+        "--plan_budget",
+        type=float,
+        default=0.1,
+        help="The most time, in seconds, each planning command may take on example_config.yaml.",
+    )
+    parser.add_argument(
+        "--plan_repeats",
+        type=int,
+        default=5,
+        help="How many times to time each planning command; the median is used.",
+    )
+    parser.add_argument("--save", help="Save the results to this JSON file.")
+    parser.add_argument(
+        "--compare", help="Compare the results with ones saved with --save."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.25,
+        help="How many times slower (or bigger) than the saved results counts as a regression.",
+    )
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        stub_folder = os.path.join(folder, "bin")
+        os.makedirs(stub_folder)
+        make_stub(stub_folder)
+        results = []
+        print_header()
+        for size in options.sizes:
+            results += [bench(size, folder, stub_folder, options)]
+            print_result(results[-1])
+        plan_times = time_planning(folder, stub_folder, options)
+
+    print(
+        "Planning example_config.yaml (s): "
+        + " ".join(f"{option}:{t}" for option, t in plan_times.items())
+    )
+    over_budget = [
+        f"{option} took {t}s"
+        for option, t in plan_times.items()
+        if t > options.plan_budget
+    ]
+
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        if regressions:
+            sys.exit("Slower than before:\n" + "\n".join(regressions))
+        print("No regressions.")
+    if over_budget:
+        sys.exit(
+            f"Planning took longer than {options.plan_budget}s:\n"
+            + "\n".join(over_budget)
+        )
+
+
+if __name__ == "__main__":
+    main()
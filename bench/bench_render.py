@@ -0,0 +1,189 @@
+"""Renders a fixed corpus of trays (bench/render_corpus.yaml: every
+Build_Mode, and presets for the rest) with the real OpenSCAD, through the
+normal make_trays.py command, and compares each object's render time,
+facet count, and model size with a saved baseline:
+
+    python bench/bench_render.py              # compare with the baseline
+    python bench/bench_render.py --update     # save a new baseline
+
+Objects that render more than --tolerance times slower than the baseline
+are flagged and the script exits with an error, so a change to
+tray_generator.scad that slows rendering down gets noticed.  Changed facet
+counts (the geometry itself changed) are reported but are not an error.
+The first run, or a run on a different OpenSCAD version, saves the
+baseline instead of comparing.  Without OpenSCAD the benchmark is skipped."""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo)
+import make_trays
+
+
+def count_facets(model):
+    try:
+        if model.lower().endswith(".stl"):
+            return len(make_trays.read_stl(model))
+        if model.lower().endswith(".3mf"):
+            triangles = make_trays.read_3mf(model)
+            return None if triangles is None else len(triangles)
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def get_preset_modes(corpus):
+    # The Build_Mode of each preset in the corpus, since a preset's command
+    # has no Build_Mode setting to take it from.
+    modes = {}
+    config = make_trays.load_config_file(corpus)
+    for generator in config.get("generators", {}).values():
+        presets_file = (generator or {}).get("openscad_presets_file")
+        if not presets_file:
+            continue
+        with open(os.path.join(repo, presets_file)) as f:
+            presets = json.load(f)["parameterSets"]
+        for name, preset in presets.items():
+            modes[name] = preset.get("Build_Mode")
+    return modes
+
+
+def render_corpus(options, folder):
+    output = os.path.join(folder, "out")
+    report = os.path.join(folder, "report.json")
+    cmd = [sys.executable, "make_trays.py", "-c", options.corpus, "-o", output]
+    cmd += ["--doit", "--regen", "--skip_thumbnails", "--report", report]
+    cmd += ["-j", str(options.jobs), "--oscad", options.oscad]
+    if options.backend:
+        cmd += ["--backend", options.backend]
+    proc = subprocess.run(cmd, cwd=repo)
+    if proc.returncode != 0 or not os.path.exists(report):
+        sys.exit("make_trays.py failed, see above.")
+    with open(report) as f:
+        timings = json.load(f)["objects"]
+
+    preset_modes = get_preset_modes(os.path.join(repo, options.corpus))
+    results = {}
+    for timing in timings:
+        if timing["stage"] != "render":
+            continue
+        model = timing["model"]
+        preset = os.path.splitext(os.path.basename(model))[0]
+        results[os.path.relpath(model, output)] = {
+            "build_mode": timing["build_mode"] or preset_modes.get(preset),
+            "ok": timing["ok"],
+            # OpenSCAD's own figure, when it prints one, leaves out start-up.
+            "seconds": timing.get("openscad", timing["wall"]),
+            "facets": count_facets(model) if timing["ok"] else None,
+            "size": os.path.getsize(model) if timing["ok"] else None,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            print(f"  new:     {name}")
+            continue
+        if not result["ok"]:
+            slower += [f"{name} no longer renders"]
+            continue
+        # Anything within a second is noise, whatever the ratio.
+        if result["seconds"] > max(old["seconds"] * tolerance, old["seconds"] + 1):
+            slower += [f"{name}: {old['seconds']}s -> {result['seconds']}s"]
+        if result["facets"] != old["facets"]:
+            print(f"  facets:  {name}: {old['facets']} -> {result['facets']}")
+    for name in sorted(set(baseline) - set(results)):
+        print(f"  gone:    {name}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--oscad", default="openscad", help="The OpenSCAD executable to use."
+    )
+    parser.add_argument(
+        "--backend", help="Passed on to make_trays.py --backend when given."
+    )
+    parser.add_argument(
+        "--corpus",
+        default=os.path.join("bench", "render_corpus.yaml"),
+        help="The make_trays.py config with the objects to render.",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=os.path.join(repo, "bench", "render_baseline.json"),
+        help="Where the baseline results are kept.",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.25,
+        help="How many times slower than the baseline counts as a regression.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Renders to run at once.  More is quicker, but the times are less steady.",
+    )
+    options = parser.parse_args()
+
+    if not shutil.which(options.oscad):
+        print(f"{options.oscad} was not found, skipping the render benchmark.")
+        return
+
+    version = make_trays.get_openscad_version(options.oscad)
+    with tempfile.TemporaryDirectory() as folder:
+        results = render_corpus(options, folder)
+
+    for name, result in sorted(results.items()):
+        print(
+            f"{result['seconds']:>9.2f}s {str(result['facets']):>9} facets {str(result['size']):>10} bytes  {name}"
+        )
+
+    baseline = None
+    if os.path.exists(options.baseline) and not options.update:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline["openscad"] != version or baseline["backend"] != options.backend:
+            print("The baseline is from another OpenSCAD or backend, replacing it.")
+            baseline = None
+
+    if baseline is None:
+        with open(options.baseline, "w") as f:
+            json.dump(
+                {"openscad": version, "backend": options.backend, "objects": results},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Saved the baseline to {options.baseline}")
+        return
+
+    slower = compare(results, baseline["objects"], options.tolerance)
+    if slower:
+        sys.exit("Slower than the baseline:\n" + "\n".join(slower))
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,19 @@ import math
 import argparse
 import subprocess
 import json
-import yaml
 import logging
 import shutil
-from fuzzywuzzy import process
+import threading
+import concurrent.futures
+import hashlib
+import csv
+import time
+import heapq
+import collections
+import tempfile
+import types
+import atexit
+import signal
 
 
 def debug(*args):
@@ -37,6 +46,1662 @@ def isfloat(value):
         return False
 
 
+# Hashes of the source files that feed OpenSCAD, keyed by path.  These are read
+# once per run since every render key includes them.
+file_digests = {}
+
+
+def get_file_digest(filename):
+    if filename not in file_digests:
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        file_digests[filename] = digest.hexdigest()
+    return file_digests[filename]
+
+
+# Things that are slow to work out at start-up, kept between runs and only
+# worked out again when the file they came from changes.  It is kept next to
+# this script, wherever the tool is run from.
+startup_cache_file = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".make_trays_cache.json"
+)
+startup_cache = None
+startup_cache_lock = threading.Lock()
+
+
+def get_startup_cache():
+    global startup_cache
+    with startup_cache_lock:
+        if startup_cache is None:
+            try:
+                with open(startup_cache_file) as f:
+                    startup_cache = json.load(f)
+            except (OSError, ValueError):
+                startup_cache = {}
+            startup_cache.setdefault("yaml", {})
+            startup_cache.setdefault("openscad", {})
+            startup_cache["dirty"] = False
+            atexit.register(save_startup_cache)
+        return startup_cache
+
+
+def update_startup_cache(section, key, value):
+    cache = get_startup_cache()
+    with startup_cache_lock:
+        cache[section][key] = value
+        cache["dirty"] = True
+
+
+def save_startup_cache():
+    with startup_cache_lock:
+        if not startup_cache or not startup_cache["dirty"]:
+            return
+        try:
+            with open(f"{startup_cache_file}.tmp", "w") as f:
+                json.dump(dict(startup_cache, dirty=False), f)
+            os.replace(f"{startup_cache_file}.tmp", startup_cache_file)
+        except OSError:
+            # Nowhere to keep it, so it is worked out again next time.
+            pass
+        startup_cache["dirty"] = False
+
+
+def get_file_stamp(filename):
+    stat = os.stat(filename)
+    return [stat.st_mtime, stat.st_size]
+
+
+def load_config_file(filename):
+    if filename.endswith(".json"):
+        with open(filename) as f:
+            return json.load(f)
+
+    path = os.path.abspath(filename)
+    stamp = get_file_stamp(filename)
+    entry = get_startup_cache()["yaml"].get(path)
+    if entry and entry["stamp"] == stamp:
+        return entry["data"]
+
+    # Importing and running the YAML parser is a good part of the start-up
+    # time, so the parsed file is kept (when it survives a trip through JSON).
+    import yaml
+
+    with open(filename) as f:
+        data = yaml.safe_load(f)
+    try:
+        if json.loads(json.dumps(data)) == data:
+            update_startup_cache("yaml", path, {"stamp": stamp, "data": data})
+    except (TypeError, ValueError):
+        pass
+    return data
+
+
+# What OpenSCAD prints for --version and --help, by executable and option.
+openscad_outputs = {}
+openscad_options = ["--version", "--help"]
+
+
+def get_openscad_output(openscad_exec, option):
+    if openscad_exec not in openscad_outputs:
+        openscad_outputs[openscad_exec] = ask_openscad(openscad_exec)
+    return openscad_outputs[openscad_exec].get(option, "")
+
+
+def ask_openscad(openscad_exec):
+    # Running OpenSCAD just to ask about itself is slow, so everything that
+    # is asked is asked at once, and the answers kept together until the
+    # executable changes.
+    resolved = os.path.abspath(shutil.which(openscad_exec) or openscad_exec)
+    try:
+        stamp = get_file_stamp(resolved)
+    except OSError:
+        stamp = None
+    entry = get_startup_cache()["openscad"].get(resolved)
+    if stamp and entry and entry["stamp"] == stamp:
+        return entry["output"]
+    outputs = {}
+    try:
+        procs = {
+            option: subprocess.Popen(
+                [openscad_exec, option],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+            )
+            for option in openscad_options
+        }
+    except OSError:
+        return outputs
+    for option, proc in procs.items():
+        stdout, stderr = proc.communicate()
+        # OpenSCAD prints these on stderr.
+        outputs[option] = (stderr + stdout).strip()
+    if stamp:
+        update_startup_cache("openscad", resolved, {"stamp": stamp, "output": outputs})
+    return outputs
+
+
+def get_openscad_version(openscad_exec):
+    return get_openscad_output(openscad_exec, "--version")
+
+
+def get_backend_args(openscad_exec, backend):
+    # The options that select a geometry backend, for the OpenSCAD at hand.
+    # Builds with --backend take it by name, older development builds only
+    # have Manifold as an experimental feature, and releases have neither.
+    # None when the backend isn't available.
+    if backend == "default":
+        return []
+    text = get_openscad_output(openscad_exec, "--help")
+    if "--backend" in text:
+        return [f"--backend={backend}"]
+    if backend == "manifold" and re.search(r"\bmanifold\b", text):
+        return ["--enable=manifold"]
+    if backend == "cgal":
+        return []
+    return None
+
+
+def is_backend_arg(arg):
+    return arg.startswith("--backend=") or arg == "--enable=manifold"
+
+
+class ScadDependencies:
+    """A static look at which parts of a .scad file an object depends on.
+
+    The file is split into its top level modules, functions, assignments
+    and statements.  Branches of the top level if statements that the -D
+    settings rule out (another Build_Mode, or a lid that wasn't asked for)
+    are left out, and everything the rest refers to is followed through the
+    module and variable definitions.  Anything that can't be followed safely
+    (an include or use, or text that doesn't parse) falls back to the whole
+    file."""
+
+    ident = re.compile(r"\$?[A-Za-z_]\w*")
+    comment = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.S)
+    comparison = re.compile(r"^\s*(\$?\w+)\s*(==|!=)\s*(.+?)\s*$")
+    assignment = re.compile(r"^\s*\$?\w+\s*=\s*(.+?)\s*;$")
+
+    def __init__(self, filename):
+        with open(filename) as f:
+            self.text = self.strip_comments(f.read())
+        self.definitions = {}
+        self.statements = []
+        self.condition_names = set()
+        self.whole_file = re.search(r"^\s*(include|use)\s*<", self.text, re.M)
+        if not self.whole_file:
+            try:
+                self.parse()
+            except (IndexError, ValueError):
+                self.whole_file = True
+        self.selected_names = None
+        self.closures = {}
+        self.rotatable = {}
+
+    def strip_comments(self, text):
+        # Strings are kept as they are, a block comment becomes a space.
+        return self.comment.sub(
+            lambda m: m.group(1) or (" " if m.group(0).startswith("/*") else ""),
+            text,
+        )
+
+    def skip_space(self, i):
+        while i < len(self.text) and self.text[i].isspace():
+            i += 1
+        return i
+
+    def skip_balanced(self, i):
+        # From an opening bracket to just after its closing one.
+        closing = {"(": ")", "[": "]", "{": "}"}
+        stack = [closing[self.text[i]]]
+        i += 1
+        while stack:
+            c = self.text[i]
+            if c == '"':
+                i += 1
+                while self.text[i] != '"':
+                    i += 2 if self.text[i] == "\\" else 1
+            elif c in closing:
+                stack += [closing[c]]
+            elif c in ")]}":
+                if c != stack.pop():
+                    raise ValueError("Unbalanced brackets")
+            i += 1
+        return i
+
+    def word_at(self, i):
+        m = self.ident.match(self.text, i)
+        return m.group(0) if m else None
+
+    def skip_statement(self, i):
+        i = self.skip_space(i)
+        c = self.text[i]
+        if c == ";":
+            return i + 1
+        if c == "{":
+            return self.skip_balanced(i)
+        if c in "!#%*":
+            return self.skip_statement(i + 1)
+        word = self.word_at(i)
+        if word is None:
+            raise ValueError(f"Unexpected {c!r}")
+        i = self.skip_space(i + len(word))
+        if self.text[i] == "=":
+            return self.text.index(";", i) + 1
+        i = self.skip_balanced(i)
+        i = self.skip_statement(i)
+        if word == "if":
+            j = self.skip_space(i)
+            if self.word_at(j) == "else":
+                i = self.skip_statement(j + 4)
+        return i
+
+    def parse_if(self, start):
+        # The branches of an if/else if/else chain, as (condition, body).
+        branches = []
+        i = start
+        while True:
+            i = self.skip_space(i + 2)
+            condition_end = self.skip_balanced(i)
+            condition = self.text[i:condition_end]
+            body_end = self.skip_statement(condition_end)
+            branches += [(condition, self.text[condition_end:body_end])]
+            i = self.skip_space(body_end)
+            if self.word_at(i) != "else":
+                return branches
+            i = self.skip_space(i + 4)
+            if self.word_at(i) != "if":
+                end = self.skip_statement(i)
+                branches += [(None, self.text[i:end])]
+                return branches
+
+    def parse(self):
+        i = self.skip_space(0)
+        while i < len(self.text):
+            word = self.word_at(i)
+            if word in ["module", "function"]:
+                name = self.word_at(self.skip_space(i + len(word)))
+                if word == "module":
+                    j = self.skip_balanced(self.text.index("(", i))
+                    end = self.skip_statement(j)
+                else:
+                    end = self.text.index(";", self.skip_balanced(self.text.index("(", i)))
+                    end += 1
+                self.define(name, self.text[i:end])
+            elif word and self.text[self.skip_space(i + len(word))] == "=" and (
+                self.text[self.skip_space(i + len(word)) + 1] != "="
+            ):
+                end = self.text.index(";", i) + 1
+                self.define(word, self.text[i:end])
+                if word.startswith("$"):
+                    # Special variables reach every module without being named.
+                    self.statements += [[(None, self.text[i:end])]]
+            else:
+                end = self.skip_statement(i)
+                if word == "if":
+                    self.statements += [self.parse_if(i)]
+                    for condition, body in self.statements[-1]:
+                        self.condition_names.update(self.ident.findall(condition or ""))
+                else:
+                    self.statements += [[(None, self.text[i:end])]]
+            i = self.skip_space(end)
+
+    def define(self, name, text):
+        self.definitions[name] = self.definitions.get(name, "") + text
+
+    def get_value(self, text):
+        # A literal in a comparable form, or None for anything else.
+        text = text.strip()
+        if text in ["true", "false"] or re.match(r'^"[^"\\]*"$', text):
+            return text
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+    def decide(self, condition, settings):
+        # Whether a condition made of tests like Name == "value" joined by &&
+        # holds, from the -D settings and the file's defaults.  None when it
+        # can't be told without running the file.
+        if condition is None:
+            return True
+        text = condition.strip()[1:-1]
+        if "||" in text:
+            return None
+        result = True
+        for term in text.split("&&"):
+            m = self.comparison.match(term)
+            if not m:
+                return None
+            name, op, literal = m.groups()
+            if name in settings:
+                value = self.get_value(settings[name])
+            else:
+                default = self.assignment.match(self.definitions.get(name, ""))
+                value = self.get_value(default.group(1)) if default else None
+            literal = self.get_value(literal)
+            if value is None or literal is None:
+                return None
+            result = result and ((value == literal) == (op == "=="))
+        return result
+
+    def get_closure(self, settings):
+        # The parts of the file used with these -D settings, every name they
+        # use, and a digest of the parts.  None when only the whole file will
+        # do.  Only the settings that conditions test pick the parts, so they
+        # are worked out once for each combination of those.
+        if self.whole_file:
+            return None
+        if self.selected_names is None:
+            self.selected_names = sorted(self.condition_names)
+        selected = tuple(settings.get(name) for name in self.selected_names)
+        if selected not in self.closures:
+            parts = []
+            for branches in self.statements:
+                for condition, body in branches:
+                    taken = self.decide(condition, settings)
+                    if taken is False:
+                        continue
+                    if condition is not None:
+                        parts += [condition]
+                    parts += [body]
+                    if taken:
+                        break
+
+            names = set()
+            pending = {"Build_Mode"}
+            for part in parts:
+                pending.update(self.ident.findall(part))
+            while pending:
+                name = pending.pop()
+                if name in names:
+                    continue
+                names.add(name)
+                if name in self.definitions:
+                    pending.update(self.ident.findall(self.definitions[name]))
+            parts += [self.definitions[name] for name in sorted(names & set(self.definitions))]
+            digest = hashlib.sha256()
+            for part in parts:
+                digest.update(part.encode() + b"\0")
+            self.closures[selected] = (parts, names, digest.hexdigest())
+        return self.closures[selected]
+
+    def get_digest(self, settings):
+        closure = self.get_closure(settings)
+        if closure is None:
+            return None
+        return closure[2]
+
+    def is_rotatable(self, settings):
+        # Whether the object is the same either way round.  That only depends
+        # on the Build_Mode and the settings that stop it being, so it is
+        # decided once for each combination of those.
+        selected = tuple(
+            settings.get(name) for name in ["Build_Mode"] + unrotatable_settings
+        )
+        if selected not in self.rotatable:
+            mode = settings.get("Build_Mode", "").strip('"')
+            self.rotatable[selected] = mode in rotatable_modes and not [
+                name
+                for name in unrotatable_settings
+                if self.decide(f"({name} == true)", settings) is not False
+            ]
+        return self.rotatable[selected]
+
+
+scad_dependencies = {}
+
+
+def get_scad_dependencies(filename):
+    if filename not in scad_dependencies:
+        scad_dependencies[filename] = ScadDependencies(filename)
+    return scad_dependencies[filename]
+
+
+# Settings that swap over when an object is turned through 90 degrees.
+rotated_settings = [
+    ("Tray_Length", "Tray_Width"),
+    ("Cups_Along_Length", "Cups_Across_Width"),
+    ("Lengthwise_Cup_Ratios", "Widthwise_Cup_Ratios"),
+]
+
+# The Build_Modes that are the same object either way round, unless
+# something that isn't (a lid or box top alongside, finger slots) is added.
+rotatable_modes = ["Just_the_Tray", "Square_Cups", "Length_Width_Cups"]
+unrotatable_settings = ["Create_A_Lid", "Create_A_Box_Top", "Make_Finger_Slots"]
+
+
+def get_side(settings, names):
+    # The values of one side of a tray, in a form that can be compared.
+    side = []
+    for name in names:
+        value = settings.get(name, "")
+        try:
+            side += [(0, float(value), "")]
+        except ValueError:
+            side += [(1, 0.0, value)]
+    return side
+
+
+# -D values in their canonical form, by how they were written.
+canonical_values = {}
+
+
+def get_canonical_value(value):
+    # How a -D value was written doesn't matter, only what it is.
+    if value not in canonical_values:
+        canonical = value.strip()
+        try:
+            canonical = repr(float(canonical))
+        except ValueError:
+            pass
+        canonical_values[value] = canonical
+    return canonical_values[value]
+
+
+def get_canonical_cmd(cmd, params=None, scad="tray_generator.scad"):
+    # A normal form for the object a command builds, so that objects that
+    # only differ by being turned round, or by settings the scad file never
+    # reads, or by how a number was written, are only rendered once.  params
+    # are the command's -D settings, when they have already been read.
+    deps = get_scad_dependencies(scad)
+    if params is None:
+        params = get_cmd_params(cmd)
+    args = []
+    cmd_args = iter(cmd)
+    for arg in cmd_args:
+        if arg == "-D":
+            next(cmd_args)
+        else:
+            args += [arg]
+    settings = {name: get_canonical_value(value) for name, value in params.items()}
+
+    if "-p" not in args:
+        if deps.is_rotatable(settings):
+            # Turned so that the (length, cups along, ratios) side is the
+            # larger one, which also unifies L == W trays with swapped cups.
+            sides = [
+                get_side(settings, [names[i] for names in rotated_settings])
+                for i in range(2)
+            ]
+            if sides[0] < sides[1]:
+                for first, second in rotated_settings:
+                    values = settings.pop(first, None), settings.pop(second, None)
+                    for name, value in zip([second, first], values):
+                        if value is not None:
+                            settings[name] = value
+
+        closure = deps.get_closure(settings)
+        if closure is not None:
+            settings = {k: v for k, v in settings.items() if k in closure[1]}
+
+    return tuple(args) + tuple(sorted(settings.items()))
+
+
+class RenderCache:
+    """Records the render key that each model in an output folder was built
+    from, so models are only rebuilt when their inputs change."""
+
+    filename = ".render_cache.json"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, self.filename)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f).get("models", {})
+            except (OSError, ValueError):
+                print(f"Warning: ignoring unreadable render cache: {self.path}")
+        self.by_key = {key: model for model, key in self.entries.items()}
+
+    def lookup(self, model):
+        return self.entries.get(os.path.relpath(model, self.folder))
+
+    def find(self, key, model):
+        # Another model in this folder that was built from the same inputs.
+        with self.lock:
+            other = self.by_key.get(key)
+        if other is None:
+            return None
+        other = os.path.join(self.folder, other)
+        if os.path.abspath(other) == os.path.abspath(model):
+            return None
+        if not os.path.exists(other) or self.lookup(other) != key:
+            return None
+        return other
+
+    def record(self, model, key):
+        model = os.path.relpath(model, self.folder)
+        with self.lock:
+            self.entries[model] = key
+            self.by_key[key] = model
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"models": self.entries}, f, indent=0, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+
+class BuildJournal:
+    """An append-only log of the jobs run for an output folder.  Each job is
+    recorded when it is queued, started, and when each of its stages is done,
+    so an interrupted build can be resumed from exactly where it stopped.
+    After a build completes, only the latest run of each job is kept."""
+
+    filename = ".build_journal.jsonl"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, self.filename)
+        self.lock = threading.Lock()
+        self.file = None
+
+    def write(self, record):
+        # The file stays open for the build, and each record is flushed so
+        # it survives the build being killed.
+        with self.lock:
+            if self.file is None:
+                if not os.path.exists(self.folder):
+                    os.makedirs(self.folder)
+                self.file = open(self.path, "a")
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def compact(self):
+        # Only the latest run of each model is used, by --resume and for the
+        # build time predictions, so after a build that completed the earlier
+        # runs are dropped rather than left to grow the file on every build.
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        runs = {}
+        for record in self.read():
+            model = record.get("model")
+            if record.get("event") == "queued":
+                runs[model] = [record]
+            elif record.get("event") == "done" and model in runs:
+                runs[model] += [record]
+        with self.lock:
+            with open(f"{self.path}.tmp", "w") as f:
+                for records in runs.values():
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+            os.replace(f"{self.path}.tmp", self.path)
+
+    def read(self):
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    records += [json.loads(line)]
+                except ValueError:
+                    # The last line of a killed build can be cut short.
+                    pass
+        return records
+
+    def unfinished(self):
+        # The latest queued record of each model, and the stages of it that
+        # have not been done successfully since.
+        jobs = {}
+        for record in self.read():
+            model = record.get("model")
+            if record.get("event") == "queued":
+                jobs[model] = (record["plan"], set(record["stages"]))
+            elif record.get("event") == "done" and model in jobs and record["ok"]:
+                jobs[model][1].discard(record["stage"])
+        return [(job, stages) for job, stages in jobs.values() if stages]
+
+
+# OpenSCAD reports how long it took to render, in one of these formats
+# depending on the version.
+openscad_time_patterns = [
+    re.compile(r"Total rendering time: (\d+):(\d+):([\d.]+)"),
+    re.compile(
+        r"Total rendering time: (\d+) hours?, (\d+) minutes?, ([\d.]+) seconds?"
+    ),
+]
+
+
+def get_openscad_time(text):
+    for pattern in openscad_time_patterns:
+        match = pattern.search(text)
+        if match:
+            hours, minutes, seconds = match.groups()
+            return round(int(hours) * 3600 + int(minutes) * 60 + float(seconds), 3)
+    return None
+
+
+def get_build_mode(cmd):
+    for arg in cmd:
+        if arg.startswith("Build_Mode="):
+            return arg.split("=", 1)[1].strip('"')
+    return None
+
+
+def get_cmd_params(cmd):
+    params = {}
+    args = iter(cmd)
+    for arg in args:
+        if arg == "-D":
+            name, _, value = next(args).partition("=")
+            params[name] = value
+    return params
+
+
+def get_cost_features(cmd):
+    # What the render time of a tray mostly depends on: what is built, how
+    # big it is (in mm), and how many cups it is divided into.
+    params = get_cmd_params(cmd)
+    mode = params.get("Build_Mode", "").strip('"')
+    scale = float(params.get("Scale_Units", 1))
+    length = float(params.get("Tray_Length", 0))
+    width = float(params.get("Tray_Width", 0))
+    height = float(params.get("Tray_Height", 0))
+    if mode == "Square_Cups":
+        size = float(params["Square_Cup_Size"])
+        cups = round(length / size) * round(width / size)
+    elif mode == "Length_Width_Cups":
+        # Older builds were recorded with the misspelt Cup_Along_Length.
+        along = params.get("Cups_Along_Length", params.get("Cup_Along_Length", 1))
+        cups = int(along) * int(params["Cups_Across_Width"])
+    elif mode.startswith("Custom"):
+        layout = params.get("Custom_Col_Row_Ratios") or params.get(
+            "Custom_Division_List", ""
+        )
+        cups = max(1, len(re.findall(r"\d+(?:\.\d+)?", layout)))
+    else:
+        cups = 1
+    dimensions = tuple(round(d * scale, 1) for d in [length, width, height])
+    return mode, dimensions, cups
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class CostModel:
+    """Predicts how long an object will take to render from the render times
+    of past builds.  Objects that were built before are predicted from their
+    own history, others from the time per cup of the same Build_Mode."""
+
+    def __init__(self):
+        self.samples = 0
+        self.exact = {}
+        self.modes = {}
+
+    def add(self, cmd, duration):
+        mode, dimensions, cups = get_cost_features(cmd)
+        self.exact.setdefault((mode, dimensions, cups), [])
+        self.exact[(mode, dimensions, cups)] += [duration]
+        for name in [mode, None]:
+            total = self.modes.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += cups + 1
+        self.samples += 1
+
+    def add_journal(self, journal):
+        cmds = {}
+        for record in journal.read():
+            if record.get("event") == "queued":
+                cmds[record["model"]] = record["plan"]["cmd"]
+            elif (
+                record.get("event") == "done"
+                and record["stage"] == "render"
+                and record["ok"]
+                and "duration" in record
+                and "facet_scale" not in record
+                and "fast_path" not in record
+                and record["model"] in cmds
+            ):
+                self.add(cmds[record["model"]], record["duration"])
+
+    def predict(self, cmd):
+        if not self.samples:
+            return None
+        mode, dimensions, cups = get_cost_features(cmd)
+        durations = self.exact.get((mode, dimensions, cups))
+        if durations:
+            return sorted(durations)[len(durations) // 2]
+        total, units = self.modes.get(mode, self.modes[None])
+        return total / units * (cups + 1)
+
+    def estimate(self, cmd):
+        # Like predict(), but with no history to go on falls back on the size
+        # and number of cups of the tray, which is enough to put them in order.
+        cost = self.predict(cmd)
+        if cost is None:
+            mode, dimensions, cups = get_cost_features(cmd)
+            cost = (cups + 1) * (1 + dimensions[0] * dimensions[1] / 10000)
+        return cost
+
+
+def get_makespan(costs, workers):
+    # How long the jobs take on this many workers, each taking the next job
+    # in order as soon as it is free.
+    finish = [0.0] * workers
+    for cost in costs:
+        heapq.heappush(finish, heapq.heappop(finish) + cost)
+    return max(finish)
+
+
+def get_exit_code(status):
+    if hasattr(os, "waitstatus_to_exitcode"):
+        return os.waitstatus_to_exitcode(status)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def kill_process_tree(proc, usage, reap_lock):
+    # Kill a process that ran out of time, and anything it started.  The
+    # process is reaped under reap_lock, so once it has been its pid (and
+    # process group) could belong to something else and is left alone.
+    with reap_lock:
+        if proc.returncode is not None:
+            return
+        usage["timed_out"] = True
+        try:
+            if sys.platform == "win32":
+                subprocess.run(
+                    ["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def summarize_timings(timings, field):
+    totals = {}
+    for timing in timings:
+        total = totals.setdefault(
+            timing[field] or "none", {"count": 0, "wall": 0.0, "cpu": 0.0}
+        )
+        total["count"] += 1
+        total["wall"] = round(total["wall"] + timing["wall"], 3)
+        total["cpu"] = round(total["cpu"] + timing.get("cpu", 0.0), 3)
+        if "max_rss" in timing:
+            total["max_rss"] = max(total.get("max_rss", 0), timing["max_rss"])
+    return totals
+
+
+def make_build_report(timings, elapsed):
+    renders = [t for t in timings if t["stage"] == "render"]
+    return {
+        "elapsed": round(elapsed, 3),
+        "stages": summarize_timings(timings, "stage"),
+        "generators": summarize_timings(renders, "generator"),
+        "build_modes": summarize_timings(renders, "build_mode"),
+        "slowest": sorted(renders, key=lambda t: t["wall"], reverse=True)[:20],
+        "objects": timings,
+    }
+
+
+def write_build_report(path, timings, elapsed):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    if path.lower().endswith(".csv"):
+        fields = [
+            "model",
+            "generator",
+            "build_mode",
+            "stage",
+            "ok",
+            "wall",
+            "cpu",
+            "max_rss",
+            "openscad",
+            "timed_out",
+            "facet_scale",
+            "fast_path",
+        ]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(timings)
+        return
+    with open(path, "w") as f:
+        json.dump(make_build_report(timings, elapsed), f, indent=2)
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "localhost", int(port))
+
+
+def make_remote_task(cmd, tool, low_priority, outputs):
+    # Everything a worker needs to run a command somewhere else: the command,
+    # the contents of the files it reads, and the files it writes.  The tool
+    # itself is the worker's own.
+    task = {"cmd": cmd, "tool": tool, "low_priority": low_priority, "inputs": {}}
+    args = iter(cmd[1:])
+    for arg in args:
+        if arg == "-o":
+            next(args)
+            continue
+        path = arg.split("=", 1)[1].strip('"') if "=" in arg else arg
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                task["inputs"][path] = f.read()
+    task["outputs"] = get_tool_outputs(cmd, outputs)
+    return task
+
+
+def get_tool_outputs(cmd, outputs=()):
+    # The files a command writes: its -o files, and any others it is known to.
+    outputs = list(outputs)
+    args = iter(cmd[1:])
+    for arg in args:
+        if arg == "-o":
+            outputs += [next(args)]
+    return outputs
+
+
+def unshare_output(path):
+    # Outputs can be hard links or symlinks to a file that other objects'
+    # outputs share (a blob, or the model they were copied from).  Remove
+    # the link before a tool writes the file in place, so it writes a file
+    # of its own rather than through the link into everyone else's.
+    if os.path.islink(path) or (os.path.exists(path) and os.stat(path).st_nlink > 1):
+        os.remove(path)
+
+
+def map_remote_arg(arg, paths):
+    if arg in paths:
+        return paths[arg]
+    if "=" in arg:
+        name, value = arg.split("=", 1)
+        value = value.strip('"')
+        if value in paths:
+            return f'{name}="{paths[value]}"'
+    return arg
+
+
+class JobServer:
+    """Hands out the tools to run to --worker processes, and collects what
+    they send back.  Each task is leased to one worker at a time, and is
+    handed out again when its lease runs out without being renewed, e.g.
+    because the worker died."""
+
+    def __init__(self, lease_time, report=print):
+        self.lease_time = lease_time
+        self.report = report
+        self.lock = threading.Condition()
+        self.tasks = {}
+        self.pending = collections.deque()
+        self.leases = {}
+        self.results = {}
+        self.next_id = 0
+        self.is_closed = False
+
+    def run(self, task):
+        # Called by the coordinator, blocks until a worker has run the task.
+        with self.lock:
+            task_id = self.next_id
+            self.next_id += 1
+            task["id"] = task_id
+            task["lease_time"] = self.lease_time
+            self.tasks[task_id] = task
+            self.pending.append(task_id)
+            self.lock.notify_all()
+            while task_id not in self.results:
+                self.expire_leases()
+                self.lock.wait(1)
+            del self.tasks[task_id]
+            return self.results.pop(task_id)
+
+    def expire_leases(self):
+        now = time.time()
+        for task_id, expires in list(self.leases.items()):
+            if expires < now:
+                del self.leases[task_id]
+                self.pending.appendleft(task_id)
+                self.report([f"Lease on task {task_id} expired, handing it out again"])
+                self.lock.notify_all()
+
+    def take(self, wait=2):
+        # Called by workers.  None means there is nothing to do right now.
+        with self.lock:
+            deadline = time.time() + wait
+            while not self.pending:
+                self.expire_leases()
+                if self.is_closed or time.time() > deadline:
+                    return None
+                self.lock.wait(0.5)
+            task_id = self.pending.popleft()
+            self.leases[task_id] = time.time() + self.lease_time
+            return self.tasks[task_id]
+
+    def renew(self, task_id):
+        with self.lock:
+            if task_id not in self.leases:
+                return False
+            self.leases[task_id] = time.time() + self.lease_time
+            return True
+
+    def finish(self, task_id, result):
+        # A late result from a worker that lost its lease is still good, as
+        # long as nobody else has finished the task first.
+        with self.lock:
+            if task_id not in self.tasks or task_id in self.results:
+                return False
+            self.leases.pop(task_id, None)
+            if task_id in self.pending:
+                self.pending.remove(task_id)
+            self.results[task_id] = result
+            self.lock.notify_all()
+            return True
+
+    def close(self):
+        with self.lock:
+            self.is_closed = True
+
+    def closed(self):
+        with self.lock:
+            return self.is_closed
+
+
+def make_job_manager(address, authkey, server=None):
+    # Only --serve and --worker need multiprocessing.managers, so it is not
+    # imported on every start.
+    import multiprocessing.managers
+
+    class JobManager(multiprocessing.managers.BaseManager):
+        pass
+
+    if server is None:
+        JobManager.register("get_jobs")
+    else:
+        JobManager.register("get_jobs", callable=lambda: server)
+    return JobManager(address=parse_address(address), authkey=authkey.encode())
+
+
+def partial_path(path):
+    # Keep the extension, OpenSCAD picks the export format from it.
+    base, ext = os.path.splitext(path)
+    return f"{base}.partial{ext}"
+
+
+def link_output(src, dst):
+    # Hard link when we can, otherwise fall back to a copy.  Either way the
+    # output only appears under its real name once it is complete.
+    tmp = partial_path(dst)
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def reflink(src, dst):
+    # A copy that shares the source's blocks on file systems that can do it
+    # (Btrfs, XFS, ...), otherwise an ordinary copy.
+    try:
+        import fcntl
+
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), 0x40049409, s.fileno())  # FICLONE
+    except (ImportError, OSError):
+        shutil.copyfile(src, dst)
+
+
+class BlobStore:
+    """Keeps each distinct output file once, named by the hash of its
+    contents, under .blobs in an output folder.  The files in the output
+    tree are hard links, reflinks, or symlinks to these blobs, so identical
+    models, thumbnails and gcode made by different generators only take up
+    space once."""
+
+    dirname = ".blobs"
+
+    def __init__(self, folder, mode):
+        self.folder = folder
+        self.mode = mode
+        self.path = os.path.join(folder, self.dirname)
+        # The blob of each output placed this run, so copies don't hash again.
+        self.placed = {}
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.path, digest[:2], f"{digest}{ext}")
+
+    def get_digest(self, filename):
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def place(self, blob, dst):
+        tmp = partial_path(dst)
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        if self.mode == "symlink":
+            os.symlink(os.path.relpath(blob, os.path.dirname(dst)), tmp)
+        elif self.mode == "reflink":
+            reflink(blob, tmp)
+        else:
+            try:
+                os.link(blob, tmp)
+            except OSError:
+                shutil.copyfile(blob, tmp)
+        os.replace(tmp, dst)
+
+    def add(self, filename):
+        # Move a finished output into the store (unless the same bytes are
+        # already there) and leave a link to it in its place.
+        digest = self.get_digest(filename)
+        blob = self.blob_path(digest, os.path.splitext(filename)[1])
+        with self.lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                if self.mode == "reflink":
+                    reflink(filename, partial_path(blob))
+                    os.replace(partial_path(blob), blob)
+                else:
+                    os.replace(filename, blob)
+            self.placed[filename] = blob
+        self.place(blob, filename)
+
+    def copy(self, src, dst):
+        # Place dst as another link to the blob src was placed from.
+        # Returns False when src isn't from the store.
+        with self.lock:
+            blob = self.placed.get(src)
+        if blob is None or not os.path.exists(blob):
+            return False
+        self.place(blob, dst)
+        with self.lock:
+            self.placed[dst] = blob
+        return True
+
+    def unreferenced(self):
+        # The blobs that no file in the output tree refers to any more.
+        blobs = {}
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for name in filenames:
+                blobs[os.path.join(dirpath, name)] = os.stat(
+                    os.path.join(dirpath, name)
+                )
+        if not blobs:
+            return []
+
+        inodes = {(s.st_dev, s.st_ino): p for p, s in blobs.items()}
+        sizes = {s.st_size for s in blobs.values()}
+        used = set()
+        for dirpath, dirnames, filenames in os.walk(self.folder):
+            if dirpath == self.folder and self.dirname in dirnames:
+                dirnames.remove(self.dirname)
+            for name in filenames:
+                filename = os.path.join(dirpath, name)
+                if os.path.islink(filename):
+                    used.add(os.path.realpath(filename))
+                    continue
+                stat = os.stat(filename)
+                if (stat.st_dev, stat.st_ino) in inodes:
+                    used.add(inodes[(stat.st_dev, stat.st_ino)])
+                elif stat.st_size in sizes:
+                    # A reflink or copy can only be matched by its contents.
+                    blob = self.blob_path(
+                        self.get_digest(filename), os.path.splitext(name)[1]
+                    )
+                    used.add(blob)
+        return [
+            p for p in blobs if os.path.realpath(p) not in used and p not in used
+        ]
+
+    def clean(self):
+        removed = 0
+        freed = 0
+        for blob in self.unreferenced():
+            freed += os.path.getsize(blob)
+            os.remove(blob)
+            removed += 1
+        return removed, freed
+
+
+stl_vertex = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+threemf_vertex = re.compile(rb'<vertex\s+x="([^"]+)"\s+y="([^"]+)"\s+z="([^"]+)"')
+threemf_triangle = re.compile(rb'<triangle\s+v1="(\d+)"\s+v2="(\d+)"\s+v3="(\d+)"')
+
+
+def read_stl(filename):
+    # The triangles of an ASCII or binary STL file, as vertex tuples.
+    import struct
+
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) >= 84:
+        count = struct.unpack_from("<I", data, 80)[0]
+        if len(data) == 84 + count * 50:
+            values = struct.iter_unpack("<12fH", data[84:])
+            return [(v[3:6], v[6:9], v[9:12]) for v in values]
+    vertices = [tuple(float(c) for c in v) for v in stl_vertex.findall(data)]
+    return [tuple(vertices[i : i + 3]) for i in range(0, len(vertices) - 2, 3)]
+
+
+def read_3mf(filename):
+    # The mesh of a 3MF file with a single object, or None for anything else.
+    import zipfile
+
+    with zipfile.ZipFile(filename) as z:
+        model = z.read("3D/3dmodel.model")
+    if model.count(b"<mesh") != 1 or b"<components" in model:
+        return None
+    vertices = [tuple(float(c) for c in v) for v in threemf_vertex.findall(model)]
+    faces = [tuple(int(i) for i in t) for t in threemf_triangle.findall(model)]
+    return [tuple(vertices[i] for i in face) for face in faces]
+
+
+def merge_vertices(triangles):
+    # An indexed mesh, with each distinct vertex stored once.  Triangles
+    # that collapse to a line or point are dropped.
+    index = {}
+    faces = []
+    for triangle in triangles:
+        face = tuple(index.setdefault(v, len(index)) for v in triangle)
+        if len(set(face)) == 3:
+            faces += [face]
+    return list(index), faces
+
+
+def write_binary_stl(filename, vertices, faces):
+    import struct
+
+    with open(filename, "wb") as f:
+        f.write(b"binary STL written by make_trays".ljust(80, b" "))
+        f.write(struct.pack("<I", len(faces)))
+        for face in faces:
+            a, b, c = (vertices[i] for i in face)
+            u = [b[k] - a[k] for k in range(3)]
+            v = [c[k] - a[k] for k in range(3)]
+            n = [
+                u[1] * v[2] - u[2] * v[1],
+                u[2] * v[0] - u[0] * v[2],
+                u[0] * v[1] - u[1] * v[0],
+            ]
+            length = math.sqrt(sum(x * x for x in n)) or 1.0
+            f.write(struct.pack("<12fH", *[x / length for x in n], *a, *b, *c, 0))
+
+
+def write_3mf(filename, vertices, faces):
+    import zipfile
+
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+        "</Types>\n"
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+        "</Relationships>\n"
+    )
+    model = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+        '<resources><object id="1" type="model"><mesh><vertices>\n'
+    ]
+    model += [f'<vertex x="{x:.9g}" y="{y:.9g}" z="{z:.9g}"/>\n' for x, y, z in vertices]
+    model += ["</vertices><triangles>\n"]
+    model += [f'<triangle v1="{a}" v2="{b}" v3="{c}"/>\n' for a, b, c in faces]
+    model += ['</triangles></mesh></object></resources><build><item objectid="1"/></build></model>\n']
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as z:
+        z.writestr("[Content_Types].xml", content_types)
+        z.writestr("_rels/.rels", rels)
+        z.writestr("3D/3dmodel.model", "".join(model))
+
+
+def compact_model(src, dst):
+    # Rewrite an exported model as a binary STL or a compressed 3MF (going by
+    # dst's extension) with duplicate vertices merged.  src and dst can be
+    # the same file, and then it is only replaced when the rewrite is smaller.
+    # Returns False when src isn't a model that can be read.
+    if src.lower().endswith(".stl"):
+        triangles = read_stl(src)
+    elif src.lower().endswith(".3mf"):
+        triangles = read_3mf(src)
+    else:
+        triangles = None
+    if triangles is None:
+        return False
+    vertices, faces = merge_vertices(triangles)
+    tmp = partial_path(dst)
+    if dst.lower().endswith(".3mf"):
+        write_3mf(tmp, vertices, faces)
+    else:
+        write_binary_stl(tmp, vertices, faces)
+    if src == dst and os.path.getsize(tmp) >= os.path.getsize(src):
+        os.remove(tmp)
+    else:
+        os.replace(tmp, dst)
+    return True
+
+
+# The Build_Modes the fast path can build without OpenSCAD, and the settings
+# that have to be left like this for it to.
+fast_tray_modes = ["Just_the_Tray", "Square_Cups", "Length_Width_Cups"]
+fast_tray_requires = {
+    "Create_A_Lid": False,
+    "Create_A_Box_Top": False,
+    "Make_Finger_Slots": False,
+    "Make_Insert_Tray": False,
+    "Add_Corner_Posts": False,
+}
+
+# Part of the render key of fast path models.  Change it when the meshes the
+# fast path makes change, so they are built again.
+fast_tray_version = "1"
+
+
+class FastTray:
+    """A tray built straight from its -D settings, without OpenSCAD.
+
+    Only plain trays are covered: Just_the_Tray, and Square_Cups or
+    Length_Width_Cups, whose divider walls all run from wall to wall, with
+    no lid, box top, insert, finger slots or corner posts.  Such a tray is a
+    set of flat topped columns (the outer wall, the divider walls, and the
+    floor of each cup, standing on the stacking interlock if there is one)
+    over a 2D layout of convex tiles that meet corner to corner.  The mesh is
+    made from that layout with numpy: the top and bottom of every tile, and
+    the sides where a column stands next to a shorter one, or the outside.
+    It is the shape mkshell(), make_l_div() and make_w_div() make, down to
+    the facets of the rounded corners, but triangulated differently.
+
+    The constructor raises ValueError for any tray it can't build just as
+    tray_generator.scad would, which is then left to OpenSCAD."""
+
+    def __init__(self, settings, deps):
+        self.settings = settings
+        self.deps = deps
+        if self.get("Build_Mode") not in fast_tray_modes:
+            raise ValueError("Not a Build_Mode the fast path can build")
+        for name, value in fast_tray_requires.items():
+            if self.get(name) != value:
+                raise ValueError(f"{name} needs OpenSCAD")
+        self.layout()
+
+    def get(self, name):
+        # A setting, from the -D settings or the file's default, as a bool,
+        # number or string.
+        if name in self.settings:
+            text = self.settings[name]
+        else:
+            default = self.deps.assignment.match(self.deps.definitions.get(name, ""))
+            text = default.group(1) if default else ""
+        value = self.deps.get_value(text)
+        if value is None:
+            raise ValueError(f"{name} is not a plain value")
+        if value in ["true", "false"]:
+            return value == "true"
+        return value.strip('"') if isinstance(value, str) else value
+
+    def get_divisions(self, count):
+        # Where make_equal_cups() puts the walls, worked out the way
+        # OpenSCAD steps through [begin : step : end].
+        if count <= 0:
+            raise ValueError("No cups")
+        step = 1.0 / count
+        begin, end = step, 1.0 - step
+        if begin > end:
+            return []
+        return [begin + step * i for i in range(int((end - begin) / step) + 1)]
+
+    def layout(self):
+        # The same sums as the top of tray_generator.scad, in the same order.
+        get = self.get
+        scale = get("Scale_Units")
+        wall = get("Tray_Wall_Thickness")
+        if get("Dimensions_Are_External"):
+            length, width = get("Tray_Length"), get("Tray_Width")
+            height = get("Tray_Height")
+            internal_length = get("Tray_Length") - 2 * wall
+            internal_width = get("Tray_Width") - 2 * wall
+        else:
+            length = get("Tray_Length") + 2 * wall
+            width = get("Tray_Width") + 2 * wall
+            height = get("Tray_Height") + get("Floor_Thickness")
+            internal_length, internal_width = get("Tray_Length"), get("Tray_Width")
+
+        self.wall = scale * wall
+        self.floor = scale * get("Floor_Thickness")
+        self.height = scale * height
+        self.radius = scale * get("Corner_Roundness") * wall
+        divider = scale * get("Divider_Wall_Thickness")
+        interlock = scale * get("Interlock_Height")
+        gap = scale * get("Interlock_Gap")
+        self.facets = max(3, math.floor(20 * get("Facet_Scale") + 0.5))
+
+        # Half the size of the outside of the tray, the inside, and the
+        # interlock underneath.
+        self.outer = (scale * length / 2, scale * width / 2)
+        self.inner = (
+            (scale * length - 2 * self.wall) / 2,
+            (scale * width - 2 * self.wall) / 2,
+        )
+        self.boss, self.bottom = self.inner, 0.0
+        if interlock > 0:
+            if gap < 0 or interlock <= 0.001:
+                raise ValueError("An interlock that doesn't fit")
+            self.boss = (self.inner[0] - gap / 2, self.inner[1] - gap / 2)
+            self.bottom = (-interlock / 2 + 0.001) - interlock / 2
+        if min(self.boss) <= self.radius or not 0.001 < self.floor < self.height:
+            raise ValueError("Not a tray that makes sense")
+        if self.radius > 0 and self.facets % 4:
+            # The corners would have a facet across the join with the sides.
+            raise ValueError("Facets that don't fit the corners")
+
+        lengthwise, widthwise = [], []
+        mode = get("Build_Mode")
+        if mode == "Square_Cups" and get("Square_Cup_Size") != 0:
+            along = get("Tray_Length") / get("Square_Cup_Size")
+            across = get("Tray_Width") / get("Square_Cup_Size")
+            if along == math.floor(along) and across == math.floor(across):
+                widthwise = self.get_divisions(along)
+                lengthwise = self.get_divisions(across)
+        elif mode == "Length_Width_Cups":
+            widthwise = self.get_divisions(get("Cups_Along_Length"))
+            lengthwise = self.get_divisions(get("Cups_Across_Width"))
+
+        recess = scale * (
+            get("Interlock_Height")
+            if interlock > 0
+            else get("Interlock_Divider_Wall_Recess")
+        )
+        room_for_lid = (
+            get("Make_Room_For_Recessed_Lid_And_Stacked_Tray")
+            and get("Lid_Thickness") == 0
+        )
+        divider_height = (
+            self.height
+            - (2 if room_for_lid else 1) * recess
+            - (
+                0.31
+                if room_for_lid and get("Label_Lid") and get("Label_Lid_Style") == "Raised"
+                else 0
+            )
+            - scale * get("Insert_Tray_Height")
+        )
+        tmp_hdiv = (divider_height - self.floor) * get("Divider_Wall_Height_Scale")
+        if tmp_hdiv < 0 and (lengthwise or widthwise):
+            raise ValueError("Divider walls below the floor")
+        self.top = tmp_hdiv / 2 + self.floor - 0.001 + tmp_hdiv / 2
+        if self.top <= self.floor:
+            lengthwise, widthwise = [], []
+        elif self.top >= self.height and (lengthwise or widthwise):
+            raise ValueError("Divider walls above the tray")
+
+        # The lines the inside is cut up along, at the sides of the walls.
+        self.xs = self.get_lines(
+            widthwise, internal_length * scale + divider, divider, self.boss[0]
+        )
+        self.ys = self.get_lines(
+            lengthwise, internal_width * scale + divider, divider, self.boss[1]
+        )
+
+    def get_lines(self, positions, span, divider, half):
+        lines = [-half]
+        for pos in positions:
+            middle = (span * pos) - (span / 2)
+            lines += [middle - divider / 2, middle + divider / 2]
+        lines += [half]
+        straight = half - self.radius
+        if lines != sorted(set(lines)) or (
+            positions and not -straight < lines[1] < lines[-2] < straight
+        ):
+            # Walls that overlap, or run into the rounded corners.
+            raise ValueError("Divider walls that don't fit")
+        return lines
+
+    def get_corner(self, x, y, quadrant):
+        # The facets of the rounded corner of a rectangle reaching out to
+        # (x, y), anticlockwise from one side to the next.  quadrant counts
+        # anticlockwise from the corner at +x +y.
+        if self.radius == 0:
+            return [(x, y)]
+        sx, sy = [(1, 1), (-1, 1), (-1, -1), (1, -1)][quadrant]
+        cx, cy = x - sx * self.radius, y - sy * self.radius
+        steps = self.facets // 4
+        corner = []
+        for i in range(1, steps):
+            angle = 2 * math.pi * (quadrant * steps + i) / self.facets
+            corner += [
+                (cx + self.radius * math.cos(angle), cy + self.radius * math.sin(angle))
+            ]
+        if quadrant % 2:
+            return [(cx, y)] + corner + [(x, cy)]
+        return [(x, cy)] + corner + [(cx, y)]
+
+    def get_ring(self, inner, outer, within=None):
+        # The tiles of the band between two rounded rectangles, split where
+        # the lines of the inside meet it (and where the corners of another
+        # band within it start), as pairs of points across it all the way
+        # round.
+        (xi, yi), (xo, yo) = inner, outer
+        cx, cy = xi - self.radius, yi - self.radius
+        xs, ys = self.xs[1:-1], self.ys[1:-1]
+        if within is not None:
+            x, y = within[0] - self.radius, within[1] - self.radius
+            xs, ys = [-x] + xs + [x], [-y] + ys + [y]
+        ring = [((xi, y), (xo, y)) for y in [-cy] + ys + [cy]]
+        ring += zip(self.get_corner(xi, yi, 0), self.get_corner(xo, yo, 0))
+        ring += [((x, yi), (x, yo)) for x in [cx] + xs[::-1] + [-cx]]
+        ring += zip(self.get_corner(-xi, yi, 1), self.get_corner(-xo, yo, 1))
+        ring += [((-xi, y), (-xo, y)) for y in [cy] + ys[::-1] + [-cy]]
+        ring += zip(self.get_corner(-xi, -yi, 2), self.get_corner(-xo, -yo, 2))
+        ring += [((x, -yi), (x, -yo)) for x in [-cx] + xs + [cx]]
+        ring += zip(self.get_corner(xi, -yi, 3), self.get_corner(xo, -yo, 3))
+        tiles = []
+        for (inner, outer), (next_inner, next_outer) in zip(ring, ring[1:] + ring[:1]):
+            tile = [inner, outer, next_outer]
+            if next_inner != inner:
+                tile += [next_inner]
+            tiles += [tile]
+        return tiles
+
+    def get_top(self, tile):
+        # How high the inside is over a tile: the divider walls run the
+        # whole way across, between every other pair of lines.
+        x = sum(p[0] for p in tile) / len(tile)
+        y = sum(p[1] for p in tile) / len(tile)
+        for lines, middle in [(self.xs, x), (self.ys, y)]:
+            for low, high in zip(lines[1:-1:2], lines[2:-1:2]):
+                if low < middle < high:
+                    return self.top
+        return self.floor
+
+    def get_tiles(self):
+        # The tiles of the layout, as anticlockwise lists of points, and the
+        # bottom and top of the column on each.
+        tiles, columns = [], []
+        within = self.boss if self.boss != self.inner else None
+        for tile in self.get_ring(self.inner, self.outer, within):
+            tiles += [tile]
+            columns += [(0.0, self.height)]
+        if self.boss != self.inner:
+            # The gap around the interlock.
+            for tile in self.get_ring(self.boss, self.inner):
+                tiles += [tile]
+                columns += [(0.0, self.get_top(tile))]
+
+        xs, ys = self.xs, self.ys
+        for i in range(len(xs) - 1):
+            for j in range(len(ys) - 1):
+                x0, x1, y0, y1 = xs[i], xs[i + 1], ys[j], ys[j + 1]
+                tile = []
+                corners = [(x0, y0, 2), (x1, y0, 3), (x1, y1, 0), (x0, y1, 1)]
+                for x, y, quadrant in corners:
+                    if (abs(x), abs(y)) == self.boss:
+                        tile += self.get_corner(x, y, quadrant)
+                    else:
+                        tile += [(x, y)]
+                tiles += [tile]
+                columns += [(self.bottom, self.top if i % 2 or j % 2 else self.floor)]
+        return tiles, columns
+
+    def get_mesh(self):
+        # The vertices and triangles of the tray, as numpy arrays.
+        import numpy as np
+
+        tiles, columns = self.get_tiles()
+        index = {}
+        flat = np.array(
+            [index.setdefault(p, len(index)) for tile in tiles for p in tile],
+            dtype=np.int64,
+        )
+        points = np.array(list(index), dtype=np.float64)
+        sizes = np.array([len(tile) for tile in tiles], dtype=np.int64)
+        starts = np.cumsum(sizes) - sizes
+        columns = np.array(columns, dtype=np.float64)
+        levels = np.unique(columns)
+        bottom = np.searchsorted(levels, columns[:, 0])
+        top = np.searchsorted(levels, columns[:, 1])
+        # A vertex is a point of the layout at one of the levels.
+        vertex = lambda point, level: point * len(levels) + level
+
+        # The top and bottom of each tile, as fans of triangles.
+        fans = sizes - 2
+        fan_tile = np.repeat(np.arange(len(tiles)), fans)
+        fan_step = np.arange(fans.sum()) - np.repeat(np.cumsum(fans) - fans, fans) + 1
+        first = flat[starts[fan_tile]]
+        second = flat[starts[fan_tile] + fan_step]
+        third = flat[starts[fan_tile] + fan_step + 1]
+        up, down = top[fan_tile], bottom[fan_tile]
+        faces = [
+            np.stack([vertex(first, up), vertex(second, up), vertex(third, up)], 1),
+            np.stack(
+                [vertex(first, down), vertex(third, down), vertex(second, down)], 1
+            ),
+        ]
+
+        # The sides, level by level, wherever the tile on the left of an edge
+        # (going round its tile anticlockwise) is solid and the tile on the
+        # right, or the outside, isn't.  Splitting the sides at every level
+        # gives the sides that meet at a corner the same vertices.
+        following = np.arange(len(flat)) + 1
+        following[starts + sizes - 1] = starts
+        a, b = flat, flat[following]
+        edge_tile = np.repeat(np.arange(len(tiles)), sizes)
+        edges = a * len(points) + b
+        order = np.argsort(edges)
+        reverse = b * len(points) + a
+        twin = np.minimum(np.searchsorted(edges[order], reverse), len(edges) - 1)
+        found = edges[order][twin] == reverse
+        twin_tile = edge_tile[order][twin]
+        for level in range(len(levels) - 1):
+            solid = (bottom <= level) & (level < top)
+            side = solid[edge_tile] & ~(found & solid[twin_tile])
+            low, high = vertex(a[side], level), vertex(b[side], level)
+            faces += [
+                np.stack([low, high, high + 1], 1),
+                np.stack([low, high + 1, low + 1], 1),
+            ]
+
+        used, faces = np.unique(np.concatenate(faces), return_inverse=True)
+        vertices = np.column_stack(
+            [points[used // len(levels)], levels[used % len(levels)]]
+        )
+        return vertices, faces.reshape(-1, 3)
+
+    def write(self, filename):
+        # As a binary STL or a 3MF, going by the extension.
+        vertices, faces = self.get_mesh()
+        if filename.lower().endswith(".3mf"):
+            write_3mf(filename, vertices.tolist(), faces.tolist())
+        else:
+            write_binary_stl(filename, vertices.tolist(), faces.tolist())
+        return len(faces)
+
+
+def has_numpy():
+    # Without importing it, which would take longer than planning does.
+    import importlib.util
+
+    return importlib.util.find_spec("numpy") is not None
+
+
+def get_fast_tray(cmd):
+    # The fast path's tray for an OpenSCAD command, or None when it has to
+    # go to OpenSCAD (or numpy isn't installed).
+    scad = [arg for arg in cmd if arg.endswith(".scad")]
+    if "-p" in cmd or len(scad) != 1:
+        return None
+    if not has_numpy():
+        return None
+    try:
+        return FastTray(get_cmd_params(cmd), get_scad_dependencies(scad[0]))
+    except (ValueError, OSError):
+        return None
+
+
+# The geometry backends that can be asked for.
+backends = ["auto", "default", "cgal", "manifold"]
+
+
+# The model formats the meshes can be post-processed into, by mesh_format.
+mesh_formats = {"none": None, "binary_stl": "stl", "3mf": "3mf"}
+
+
+# Config settings that are lists (given in a config file as one space
+# separated string, or a single value), and those of them that are lists of
+# numbers.  They are converted once, when the config layers are merged.
+config_list_keys = [
+    "openscad_flags",
+    "dimensions",
+    "lengths",
+    "widths",
+    "heights",
+    "openscad_preset_names",
+    "length_skip_divs",
+    "width_skip_divs",
+    "square_cup_sizes",
+    "lid_styles",
+    "gen_list",
+    "other_oscad_params",
+    "interlock_dimensions",
+]
+config_float_keys = ["lengths", "widths", "heights"]
+
+
+def resolve_config_value(key, value):
+    if key in config_list_keys and type(value) is not list:
+        value = value.split() if type(value) == str else [value]
+    if key in config_float_keys:
+        value = [float(i) for i in value]
+    return value
+
+
 # https://stackoverflow.com/questions/15008758/parsing-boolean-values-with-argparse
 def str2bool(v):
     if isinstance(v, bool):
@@ -59,8 +1724,10 @@ class MakeTrays:
         return f"{numstr(length)}x{numstr(width)}_{generator['unit_name']}"
 
     def get_oscad_command(self, generator, length, width, height, params):
-        # First, the executable...
+        # First, the executable and how it should render...
         cmd = [generator["openscad_exec"]]
+        cmd += generator["backend_args"]
+        cmd += generator["openscad_flags"]
 
         # Then the thickness parameters, which are computed from the unit base
         cmd += generator["wall_defs"]
@@ -86,6 +1753,7 @@ class MakeTrays:
 
     def make_files_dict(self, generator, folder_path, file_base):
         files = {
+            "root": generator["output_folder"],
             "folder": folder_path,
             "base": file_base,
             "png": f"{file_base}.png",
@@ -103,98 +1771,874 @@ class MakeTrays:
 
         return f"{generator['output_folder']}/{subfolder}"
 
-    def slice(self, files, count_only, force_slice):
-        tray_file_path_model = files["model"]
-        tray_file_path_gcode = files["gcode"]
-        if not self.args.dryrun and not count_only:
-            if not os.path.exists(files["folder"]):
-                os.makedirs(files["folder"])
+    def start_workers(self, stage):
+        # Renders and slices each have their own pool of worker threads, each of
+        # which drives one external process at a time.  Finished renders are
+        # handed straight to the slice pool, so slicing overlaps with rendering.
+        max_workers = self.args.jobs
+        if stage == "slice" and self.args.slice_jobs:
+            max_workers = self.args.slice_jobs
+        if stage == "thumbnail" and self.args.thumbnail_jobs:
+            max_workers = self.args.thumbnail_jobs
+        if stage == "compact":
+            # Reading and rewriting a mesh is Python all the way through and
+            # holds the GIL, so it gets processes rather than threads.
+            import multiprocessing
+
+            self.work_pools[stage] = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            return
+        self.work_pools[stage] = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers
+        )
 
-        if (
-            force_slice
-            or self.args.slice
-            and os.path.exists(tray_file_path_model)
-            and (self.args.reslice or not os.path.exists(tray_file_path_gcode))
+    def submit_work(self, stage, fn, *args):
+        # Only a few renders are queued ahead of the workers, so planning never
+        # runs far ahead of rendering and memory use stays flat.
+        if stage == "render":
+            self.render_slots.acquire()
+        # Workers submit slices too, so the pools are guarded by the lock.
+        with self.work_lock:
+            if self.work_pools.get(stage) is None:
+                self.start_workers(stage)
+            future = self.work_pools[stage].submit(fn, *args)
+        future.add_done_callback(lambda f: self.work_done(stage, f))
+
+    def work_done(self, stage, future):
+        if stage == "render":
+            self.render_slots.release()
+        if future.exception() is not None:
+            with self.work_lock:
+                self.work_errors += [future.exception()]
+
+    def wait_for_workers(self):
+        # Renders feed the slice and thumbnail stages, so drain them first.
+        for stage in ["render", "compact", "slice", "thumbnail"]:
+            if self.work_pools.get(stage) is None:
+                continue
+            self.work_pools[stage].shutdown(wait=True)
+            self.work_pools[stage] = None
+
+        if self.work_errors:
+            # Re-raise anything that went wrong inside a worker.
+            error = self.work_errors[0]
+            self.work_errors = []
+            raise error
+
+    def get_render_cache(self, folder):
+        if folder not in self.render_caches:
+            self.render_caches[folder] = RenderCache(folder)
+        return self.render_caches[folder]
+
+    def get_blob_store(self, folder):
+        if self.args.link_mode == "none":
+            return None
+        with self.work_lock:
+            if folder not in self.blob_stores:
+                self.blob_stores[folder] = BlobStore(folder, self.args.link_mode)
+            return self.blob_stores[folder]
+
+    def store_output(self, folder, filename):
+        store = self.get_blob_store(folder)
+        if store is not None and os.path.exists(filename):
+            store.add(filename)
+
+    def copy_output(self, folder, src, dst):
+        store = self.get_blob_store(folder)
+        if store is not None and store.copy(src, dst):
+            return
+        link_output(src, dst)
+        if store is not None:
+            store.add(dst)
+
+    def clean_blobs(self):
+        for folder in self.get_output_folders():
+            store = BlobStore(folder, self.args.link_mode)
+            if self.args.dryrun:
+                for blob in store.unreferenced():
+                    print(f"Unreferenced: {blob}")
+                continue
+            removed, freed = store.clean()
+            print(f"Removed {removed} unreferenced blobs ({freed/1e6:.1f} MB) from {folder}")
+
+    def save_render_caches(self):
+        if self.args.dryrun:
+            return
+        for cache in self.render_caches.values():
+            cache.save()
+
+    def get_journal(self, folder):
+        with self.work_lock:
+            if folder not in self.journals:
+                self.journals[folder] = BuildJournal(folder)
+            return self.journals[folder]
+
+    def close_journals(self):
+        for journal in self.journals.values():
+            journal.close()
+
+    def compact_journals(self):
+        if self.args.dryrun:
+            return
+        for journal in self.journals.values():
+            journal.compact()
+
+    def log_job(self, job, event, **fields):
+        if self.args.dryrun:
+            return
+        record = {
+            "event": event,
+            "model": job["files"]["model"],
+            "key": job["key"],
+            "time": time.time(),
+        }
+        record.update(fields)
+        self.get_journal(job["files"]["root"]).write(record)
+
+    def log_queued(self, job):
+        stages = []
+        if job["render"]:
+            stages += ["render"]
+        if job["slice"]:
+            stages += ["slice"]
+        if job["thumbnail_cmd"] and job["source"] is None:
+            stages += ["thumbnail"]
+        self.log_job(
+            job,
+            "queued",
+            stages=stages,
+            plan={
+                name: job[name]
+                for name in [
+                    "generator",
+                    "model_format",
+                    "cmd",
+                    "key",
+                    "files",
+                    "slice",
+                    "thumbnail_cmd",
+                    "export",
+                    "timeout",
+                    "retry_facet_scale",
+                    "fast_path",
+                ]
+            },
+        )
+
+    def log_done(self, job, stage, ok, usage=None, output=None):
+        fields = {"stage": stage, "ok": ok}
+        if usage is not None:
+            fields["duration"] = usage["wall"]
+            fields.update(usage)
+            del fields["wall"]
+            self.record_timing(job, stage, ok, usage)
+        if ok and output and os.path.exists(output):
+            fields["size"] = os.path.getsize(output)
+        self.log_job(job, "done", **fields)
+
+    def record_timing(self, job, stage, ok, usage):
+        timing = {
+            "model": job["files"]["model"],
+            "root": job["files"]["root"],
+            "generator": job["generator"],
+            "build_mode": get_build_mode(job["cmd"]),
+            "stage": stage,
+            "ok": ok,
+        }
+        timing.update(usage)
+        with self.work_lock:
+            self.timings += [timing]
+
+    def write_build_reports(self):
+        if self.args.dryrun or not self.timings:
+            return
+        elapsed = time.time() - self.build_started
+        if self.args.report:
+            paths = {self.args.report: self.timings}
+        else:
+            # One report in each output folder, covering the objects in it.
+            paths = {}
+            for timing in self.timings:
+                path = os.path.join(timing["root"], "build_report.json")
+                paths.setdefault(path, [])
+                paths[path] += [timing]
+        for path, timings in paths.items():
+            write_build_report(path, timings, elapsed)
+            print(f"Build report written to: {path}")
+
+    def get_render_key(self, cmd, whole_files=False, params=None):
+        # The key covers everything that affects the rendered geometry: the
+        # OpenSCAD command (less the output file names, so identical objects
+        # share a key), the scad and preset sources, and the OpenSCAD version.
+        # The backend options are in the command, so a model built with one
+        # backend isn't taken for one built with another.
+        # Only the parts of the scad file the object uses, and only the -D
+        # settings those parts read, are counted, so editing the lid code
+        # leaves the trays current.  whole_files gives the key used before
+        # this was done.  params are the command's -D settings, when they have
+        # already been read.
+        closure = None
+        scad = [arg for arg in cmd if arg.endswith(".scad")]
+        if not whole_files and "-p" not in cmd and len(scad) == 1:
+            if params is None:
+                params = get_cmd_params(cmd)
+            closure = get_scad_dependencies(scad[0]).get_closure(params)
+        key = hashlib.sha256()
+        key.update(get_openscad_version(cmd[0]).encode())
+        args = iter(cmd)
+        for arg in args:
+            if arg == "-o":
+                output = next(args)
+                key.update(os.path.splitext(output)[1].encode())
+                continue
+            if arg == "-D" and closure is not None:
+                setting = next(args)
+                if setting.partition("=")[0] in closure[1]:
+                    key.update(arg.encode() + b"\0" + setting.encode() + b"\0")
+                continue
+            key.update(arg.encode() + b"\0")
+            if arg == "-p":
+                preset_file = next(args)
+                key.update(get_file_digest(preset_file).encode())
+            elif arg.endswith(".scad"):
+                if closure is not None:
+                    key.update(closure[2].encode())
+                else:
+                    key.update(get_file_digest(arg).encode())
+        return key.hexdigest()
+
+    def is_current(self, files, key, cmd):
+        if not os.path.exists(files["model"]):
+            return False
+        cache = self.get_render_cache(files["root"])
+        recorded = cache.lookup(files["model"])
+        if recorded is None or (
+            recorded != key and recorded == self.get_render_key(cmd, whole_files=True)
         ):
-            self.number_of_objects_sliced += 1
-            slice_cmd = get_slice_cmd(tray_file_path_model)
-            if not count_only:
-                print("    ", f"Slicing:   {tray_file_path_model}")
-                self.result["slices"] += [files["gcode"]]
-            if not self.args.dryrun and not count_only:
-                logging.info("Slicing:", slice_cmd)
-                slicer = subprocess.run(
-                    slice_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                )
+            # Built before the render cache existed, or recorded with a key
+            # over the whole scad file, so assume it is current and adopt it,
+            # rather than rebuilding a whole existing library.
+            if not self.args.dryrun and not self.args.preview_only:
+                cache.record(files["model"], key)
+            return True
+        return recorded == key
+
+    def link_outputs(self, model, files):
+        # Place the outputs of an identical object at this object's file names.
+        if not os.path.exists(files["folder"]):
+            os.makedirs(files["folder"])
+        if not self.args.preview_only:
+            self.copy_output(files["root"], model, files["model"])
+        png = f"{os.path.splitext(model)[0]}.png"
+        if os.path.exists(png):
+            self.copy_output(files["root"], png, files["png"])
+
+    def reuse_cached(self, files, key):
+        cache = self.get_render_cache(files["root"])
+        cached = cache.find(key, files["model"])
+        if cached is None:
+            return False
+        self.link_outputs(cached, files)
+        return True
 
-                if self.args.show_output or slicer.returncode != 0:
-                    if slicer.stdout:
-                        print(slicer.stdout)
-                    if slicer.stderr:
-                        print(slicer.stderr)
+    def report(self, lines):
+        # Workers finish in any order, so everything an object prints is
+        # emitted as a single block to keep output from interleaving.
+        with self.output_lock:
+            for line in lines:
+                print(line)
 
-    def render_object(self, cmd, files, count_only):
-        if count_only:
-            self.number_of_objects += 1
+    def run_tool(
+        self, cmd, low_priority=False, outputs=(), tool="openscad", timeout=None
+    ):
+        for path in get_tool_outputs(cmd, outputs):
+            unshare_output(path)
+        if self.job_server is not None:
+            # Handed to a --worker process, which may be on another machine.
+            task = make_remote_task(cmd, tool, low_priority, outputs)
+            task["timeout"] = timeout
+            result = self.job_server.run(task)
+            returncode = result["returncode"]
+            stdout, stderr, usage = result["stdout"], result["stderr"], result["usage"]
+            for path, data in result["outputs"].items():
+                # Only write the files this task was asked to make, a worker
+                # must not be able to overwrite anything else here.
+                if path not in task["outputs"]:
+                    stderr += f"\nRejected unexpected output from the worker: {path}"
+                    returncode = returncode or 1
+                    continue
+                with open(partial_path(path), "wb") as f:
+                    f.write(data)
+                os.replace(partial_path(path), path)
+        else:
+            returncode, stdout, stderr, usage = self.run_process(
+                cmd, low_priority, timeout
+            )
 
-        _files = [files["png"]]
+        output = []
+        if self.args.show_output or returncode != 0:
+            if stdout:
+                output += [stdout]
+            if stderr:
+                output += [stderr]
+        proc = subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+        return proc, output, usage
+
+    def run_process(self, cmd, low_priority=False, timeout=None):
+        if low_priority and hasattr(os, "nice") and shutil.which("nice"):
+            # Let renders and slices have the CPU first.  (nice(1) rather than
+            # a preexec_fn, which isn't safe to use from the worker threads.)
+            cmd = ["nice", "-n", "10"] + cmd
+
+        start = time.time()
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            # In a group of its own, so a timeout can kill whatever it started.
+            start_new_session=timeout is not None and sys.platform != "win32",
+        )
 
-        cmd += ["-o", files["png"]]
+        usage = {}
+        timer = None
+        reap_lock = threading.Lock()
+        if timeout is not None:
+            timer = threading.Timer(
+                timeout, kill_process_tree, [proc, usage, reap_lock]
+            )
+            timer.start()
+        if hasattr(os, "wait4"):
+            # Read the output here rather than with communicate(), so the
+            # process can be reaped with wait4(), which also reports the CPU
+            # time and peak memory it used.
+            stderr = []
+            reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+            reader.start()
+            stdout = proc.stdout.read()
+            reader.join()
+            stderr = stderr[0]
+            proc.stdout.close()
+            proc.stderr.close()
+            # Reap it under the lock, so the timer can't kill it (or whatever
+            # gets its pid next) once it has been reaped.
+            if hasattr(os, "waitid"):
+                # Wait for it to exit without reaping it first.
+                os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+                with reap_lock:
+                    _, status, rusage = os.wait4(proc.pid, 0)
+                    proc.returncode = get_exit_code(status)
+            else:
+                # Without waitid, poll with a wait4() that doesn't block, so
+                # the lock is only held for a moment at a time.
+                while proc.returncode is None:
+                    with reap_lock:
+                        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+                        if pid != 0:
+                            proc.returncode = get_exit_code(status)
+                    if proc.returncode is None:
+                        time.sleep(0.01)
+            usage["cpu"] = round(rusage.ru_utime + rusage.ru_stime, 3)
+            # Kilobytes, except on macOS where it is bytes.
+            usage["max_rss"] = rusage.ru_maxrss
+            if sys.platform == "darwin":
+                usage["max_rss"] //= 1024
+        else:
+            stdout, stderr = proc.communicate()
+        if timer is not None:
+            timer.cancel()
+        usage["wall"] = round(time.time() - start, 3)
+        if usage.get("timed_out"):
+            stderr += f"\nKilled after the time limit of {format_duration(timeout)}.\n"
+
+        openscad_time = get_openscad_time(stderr + stdout)
+        if openscad_time is not None:
+            usage["openscad"] = openscad_time
+
+        return proc.returncode, stdout, stderr, usage
+
+    def run_to_partial(self, cmd, output, low_priority=False, timeout=None):
+        # The tool writes to a temporary name, and the result is only moved
+        # into place when it succeeds, so a killed run never leaves behind a
+        # half-written file that looks finished.
+        partial = partial_path(output)
+        proc, lines, usage = self.run_tool(
+            [partial if arg == output else arg for arg in cmd],
+            low_priority,
+            timeout=timeout,
+        )
+        if proc.returncode == 0 and os.path.exists(partial):
+            os.replace(partial, output)
+        elif os.path.exists(partial):
+            os.remove(partial)
+        return proc, lines, usage
+
+    def run_slice(self, job):
+        slice_cmd = get_slice_cmd(job["files"]["model"])
+        logging.info("Slicing:", slice_cmd)
+        slicer, output, usage = self.run_tool(
+            slice_cmd, outputs=[job["files"]["gcode"]], tool="slicer"
+        )
+        job["status"] = "sliced" if slicer.returncode == 0 else "slice failed"
+        if slicer.returncode == 0:
+            self.store_output(job["files"]["root"], job["files"]["gcode"])
+        self.log_done(
+            job, "slice", slicer.returncode == 0, usage, job["files"]["gcode"]
+        )
+        self.report(output)
+
+    def run_render(self, job):
+        files = job["files"]
+        with self.output_lock:
+            self.number_of_objects_started += 1
+            print(
+                f"    Generating: ({self.number_of_objects_started} of {self.number_of_objects_total}{self.get_progress()}):"
+            )
+            print(
+                f"        Rendering: {files['png'] if self.args.preview_only else files['model']}"
+            )
+            debug("command", job["cmd"])
+
+        logging.info("Render:", job["cmd"])
+        target = files["png"] if self.args.preview_only else files["model"]
+        timeout = self.get_timeout(job)
+        if timeout is not None and timeout <= 0:
+            # The rest of the queue still goes through, and is recorded as
+            # failed, so --resume picks it up on the next run.
+            self.log_done(job, "render", False)
+            self.fail_copies(job)
+            self.report([f"Error! Out of time (--time_budget): {files['model']}"])
+            return
+
+        self.log_job(job, "start")
+        fast_tray = job["fast_path"] and get_fast_tray(job["cmd"])
+        if fast_tray:
+            out, output, usage = self.run_fast_path(fast_tray, job["cmd"], target)
+        else:
+            if job["fast_path"]:
+                # Planned for the fast path, but numpy has gone since.
+                job["key"] = self.get_render_key(job["cmd"])
+            out, output, usage = self.run_to_partial(
+                job["cmd"], job["export"] or target, timeout=timeout
+            )
+            if usage.get("timed_out") and job["retry_facet_scale"]:
+                self.log_done(job, "render", False, usage)
+                out, output, usage = self.retry_render(job, target, output)
+        self.render_finished(job, usage)
+        ok = out.returncode == 0
+        if ok and job["export"] and not fast_tray:
+            ok, lines = self.post_process(job)
+            output += lines
+
+        if not ok:
+            self.log_done(job, "render", False, usage)
+            self.fail_copies(job)
+            output += [f"Error! Aborting this object: {files['model']}"]
+            self.report(output)
+            return
+
+        self.store_output(files["root"], target)
+        self.log_done(job, "render", True, usage, target)
+        copies = self.set_status(job, "rendered")
+        self.report(output)
+        self.finish_render(job, copies)
+
+    def run_fast_path(self, fast_tray, cmd, target):
+        # Build the model in this worker, without OpenSCAD.  Returns the
+        # same as run_to_partial().
+        start, cpu = time.time(), time.thread_time()
+        partial = partial_path(target)
+        try:
+            facets = fast_tray.write(partial)
+            os.replace(partial, target)
+            returncode = 0
+            output = [f"        Built by the fast path ({facets} facets)"]
+        except OSError as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            returncode = 1
+            output = [f"Error! The fast path could not write {target}: {e}"]
+        usage = {
+            "wall": round(time.time() - start, 3),
+            "cpu": round(time.thread_time() - cpu, 3),
+            "fast_path": True,
+        }
+        return subprocess.CompletedProcess(cmd, returncode), output, usage
+
+    def get_timeout(self, job):
+        # The time a render can have: its own limit, cut short by whatever
+        # is left of the build's budget.
+        limits = []
+        if job["timeout"]:
+            limits += [job["timeout"]]
+        if self.args.time_budget:
+            limits += [self.args.time_budget - (time.time() - self.build_started)]
+        return min(limits) if limits else None
+
+    def retry_render(self, job, target, output):
+        # Try again with fewer facets on the round parts.  The model is
+        # recorded under the key of what was actually built, so the next
+        # run tries it at full quality again.
+        scale = job["retry_facet_scale"]
+        cmd = job["cmd"][:-1] + ["-D", f"Facet_Scale={scale}", job["cmd"][-1]]
+        output += [f"        Timed out, retrying with Facet_Scale={scale}"]
+        timeout = self.get_timeout(job)
+        if timeout is not None and timeout <= 0:
+            out = subprocess.CompletedProcess(cmd, 1)
+            return out, output + ["Out of time (--time_budget)"], {"wall": 0.0}
+        out, more, usage = self.run_to_partial(
+            cmd, job["export"] or target, timeout=timeout
+        )
+        usage["facet_scale"] = scale
+        if out.returncode == 0:
+            job["key"] = self.get_render_key(cmd)
+        return out, output + more, usage
+
+    def fail_copies(self, job):
+        for copy in self.set_status(job, "failed"):
+            copy["status"] = "failed"
+            self.log_done(copy, "render", False)
+        self.retire_job(job)
+
+    def retire_job(self, job):
+        # Once an object is finished, later duplicates of it only copy its
+        # model (or fail with it), so that is all that is kept for them,
+        # rather than the whole job and the copies made of it.
+        with self.copy_lock:
+            if self.issued_cmds.get(job["cmd_key"]) is not job:
+                return
+            self.issued_cmds[job["cmd_key"]] = {
+                "files": {"model": job["files"]["model"]},
+                "render": False,
+                "status": job["status"],
+                "copies": None,
+            }
+
+    def post_process(self, job):
+        # Runs in the render worker, straight after the render, which waits
+        # while a process from the compact pool does the work.  Returns whether
+        # there is a model, and what to report.
+        export, model = job["export"], job["files"]["model"]
+        before = os.path.getsize(export)
+        with self.work_lock:
+            if self.work_pools.get("compact") is None:
+                self.start_workers("compact")
+            future = self.work_pools["compact"].submit(compact_model, export, model)
+        try:
+            compacted = future.result()
+            problem = "not a mesh that can be post-processed"
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            compacted = False
+            problem = e
+        if not compacted:
+            if export != model:
+                # Keeping the export under the model's name would give it
+                # the wrong format.
+                os.remove(export)
+                return False, [f"Error! Could not post-process {export}: {problem}"]
+            return True, [f"        Left as exported ({problem}): {model}"]
+        if export != model:
+            os.remove(export)
+        after = os.path.getsize(model)
+        if export == model and after >= before:
+            return True, [f"        Left as exported (already compact): {model}"]
+        change = after * 100 / max(before, 1) - 100
+        change = f"{abs(change):.0f}% {'larger' if change > 0 else 'smaller'}"
+        return True, [
+            f"        Compacted: {model} ({before/1e6:.2f} MB -> {after/1e6:.2f} MB, {change})"
+        ]
+
+    def render_finished(self, job, usage):
+        with self.output_lock:
+            self.renders_done += 1
+            if job["cost"] is not None:
+                self.predicted_done += job["cost"]
+                self.actual_done += usage["wall"]
+
+    def get_progress(self):
+        # Called with the output lock held.
+        if not self.renders_done:
+            return ""
+        elapsed = max(time.time() - self.build_started, 0.001)
+        rate = self.renders_done / elapsed * 3600
+        progress = f", {rate:.0f} objects/hour"
+        if self.number_of_objects_total == "?":
+            return progress
+        if self.predicted_done:
+            # The predictions that are left, scaled by how well the ones so
+            # far have held up on this machine.
+            remaining = max(self.predicted_total - self.predicted_done, 0)
+            eta = remaining * self.actual_done / self.predicted_done / self.args.jobs
+        else:
+            remaining = self.number_of_objects_total - self.renders_done
+            eta = remaining / rate * 3600
+        return progress + f", ETA {format_duration(eta)}"
+
+    def set_status(self, job, status):
+        # Copies of a job that is still rendering wait on its copy list, so
+        # the status changes under the lock.  Returns the copies to be made.
+        with self.copy_lock:
+            job["status"] = status
+            return list(job["copies"])
+
+    def finish_render(self, job, copies=()):
+        files = job["files"]
         if not self.args.preview_only:
-            cmd += ["-o", files["model"]]
-            _files += [files["model"]]
+            self.get_render_cache(files["root"]).record(files["model"], job["key"])
+
+        for copy in copies:
+            self.copy_object(job, copy)
+
+        if job["slice"]:
+            self.queue_slice(job)
+
+        # Copies get their thumbnail from the original's.  A reused model
+        # brings its thumbnail with it.
+        if job["thumbnail_cmd"] and job["source"] is None:
+            if job["status"] == "rendered" or not os.path.exists(files["png"]):
+                self.queue_thumbnail(job)
+                return
+            self.log_done(job, "thumbnail", True)
+        self.retire_job(job)
+
+    def copy_object(self, source, job):
+        self.link_outputs(source["files"]["model"], job["files"])
+        job["status"] = "copied"
+        self.log_done(job, "render", True, output=job["files"]["model"])
+        self.report([f"        Copied:    {job['files']['model']}"])
+        self.finish_render(job)
+
+    def run_thumbnail(self, job):
+        files = job["files"]
+        logging.info("Thumbnail:", job["thumbnail_cmd"])
+        out, output, usage = self.run_to_partial(
+            job["thumbnail_cmd"], files["png"], low_priority=True
+        )
+        self.log_done(job, "thumbnail", out.returncode == 0, usage, files["png"])
+        if out.returncode != 0:
+            output += [f"Error! Could not create a thumbnail: {files['png']}"]
+        else:
+            with self.copy_lock:
+                copies = list(job["copies"])
+            self.store_output(files["root"], files["png"])
+            for copy in copies:
+                self.copy_output(files["root"], files["png"], copy["files"]["png"])
+        self.report(output)
+        self.retire_job(job)
+
+    def queue_thumbnail(self, job):
+        if not self.args.dryrun:
+            self.submit_work("thumbnail", self.run_thumbnail, job)
+
+    def queue_slice(self, job):
+        self.report([f"     Slicing:   {job['files']['model']}"])
+        if not self.args.dryrun:
+            self.submit_work("slice", self.run_slice, job)
+
+    def get_imgsize_arg(self, generator):
+        size = generator["thumbnail_size"].lower().split("x")
+        return f"--imgsize={int(size[0])},{int(size[1])}"
+
+    def get_thumbnail_command(self, generator, files):
+        # Thumbnails are drawn from the exported mesh, which is much quicker
+        # than evaluating the tray again.
+        model = os.path.abspath(files["model"]).replace("\\", "/")
+        return [
+            generator["openscad_exec"],
+            "-D",
+            f'Model_File="{model}"',
+            "--preview",
+            "--viewall",
+            "--autocenter",
+            self.get_imgsize_arg(generator),
+            "-o",
+            files["png"],
+            "thumbnail.scad",
+        ]
+
+    def plan_object(self, generator, cmd, files, source=None, params=None):
+        thumbnail_cmd = None
+        export = None
+        if self.args.preview_only:
+            # Only the image is wanted, so use OpenSCAD's fast preview renderer.
+            cmd += ["--preview", self.get_imgsize_arg(generator)]
+            cmd += ["-o", files["png"]]
+        else:
+            export = files["model"]
+            if generator["mesh_format"] != "none":
+                export = f"{files['base']}.{generator['export_format']}"
+            cmd += ["-o", export]
+            if not generator["skip_thumbnails"]:
+                thumbnail_cmd = self.get_thumbnail_command(generator, files)
 
         cmd += ["tray_generator.scad"]
 
-        if self.args.regen or not os.path.exists(files["model"]):
-            self.number_of_objects_generated += 1
-            _filestr = " ".join(_files)
-            if not count_only:
+        if self.args.dryrun:
+            # Planning commands have to be quick, so they skip the render key
+            # and the fast path check, and a model that exists is taken to be
+            # current.
+            key = None
+            fast_path = False
+            render = self.args.regen or not os.path.exists(files["model"])
+        else:
+            key = self.get_render_key(cmd, params=params)
+            fast_path = (
+                generator["fast_path"]
+                and not self.args.preview_only
+                and os.path.splitext(files["model"])[1].lower() in [".stl", ".3mf"]
+                and get_fast_tray(cmd) is not None
+            )
+            if fast_path:
+                # The fast path's mesh isn't OpenSCAD's, so it is kept apart.
+                key = hashlib.sha256(
+                    f"{key} fast_path {fast_tray_version}".encode()
+                ).hexdigest()
+            render = self.args.regen or not self.is_current(files, key, cmd)
+        if render:
+            slice = self.args.slice
+        else:
+            slice = self.args.slice and (
+                self.args.reslice or not os.path.exists(files["gcode"])
+            )
+            if thumbnail_cmd and os.path.exists(files["png"]):
+                thumbnail_cmd = None
+
+        return {
+            "generator": generator["name"],
+            "model_format": generator["model_format"],
+            "cmd": cmd,
+            "key": key,
+            "files": files,
+            "render": render,
+            "slice": slice,
+            "thumbnail_cmd": thumbnail_cmd,
+            # Where OpenSCAD writes the model, when it is post-processed into
+            # files["model"] afterwards.
+            "export": None if generator["mesh_format"] == "none" else export,
+            # Limits on how long the render can take.
+            "timeout": generator["timeout"],
+            "retry_facet_scale": generator["retry_facet_scale"],
+            # Built in the render worker, without OpenSCAD.
+            "fast_path": fast_path,
+            "status": "planned" if render or slice or thumbnail_cmd else "existing",
+            # The first job with the same command, whose outputs this job reuses.
+            "source": source,
+            # Later jobs with the same command, to be copied once this renders.
+            "copies": [],
+            # Its entry in issued_cmds, when later jobs can be copies of it.
+            "cmd_key": None,
+            # The predicted render time, when there is a history to go on.
+            "cost": (0.0 if fast_path else self.cost_model.predict(cmd))
+            if render
+            else None,
+        }
+
+    def generate_object(self, generator, cmd, files):
+        # The command, before output files are added, identifies the object.
+        # The same object can be reached through different generators and
+        # sizes, or turned round, but it only needs rendering once.
+        # Its -D settings are read once, for both keys.  Planning commands
+        # only spot commands that are exactly the same.
+        params = None
+        cmd_key = tuple(cmd)
+        if not self.args.dryrun:
+            params = get_cmd_params(cmd)
+            cmd_key = get_canonical_cmd(cmd, params)
+        source = self.issued_cmds.get(cmd_key)
+        if source is not None and source["files"]["model"] == files["model"]:
+            # Duplicate command generated, no need to do it again.
+            return
+
+        job = self.plan_object(generator, cmd, files, source, params)
+        if source is None:
+            job["cmd_key"] = cmd_key
+            self.issued_cmds[cmd_key] = job
+        yield job
+
+    def execute_job(self, job):
+        files = job["files"]
+        if self.args.stream:
+            self.log_queued(job)
+
+        if job["slice"]:
+            self.number_of_objects_sliced += 1
+            self.result["slices"] += [files["gcode"]]
+
+        if not job["render"]:
+            if job["slice"]:
+                self.queue_slice(job)
+            if job["thumbnail_cmd"] and not self.args.dryrun:
+                self.queue_thumbnail(job)
+            else:
+                self.retire_job(job)
+            return
+
+        self.number_of_objects_generated += 1
+        self.result["models"] += [files["model"]]
+
+        source = job["source"]
+        if self.args.dryrun:
+            if source is not None:
+                print(f"        Copying:   {files['model']}")
+            else:
+                self.number_of_objects_started += 1
                 print(
-                    f"    Generating: ({self.number_of_objects_generated} of {self.number_of_objects_total}):"
+                    f"    Generating: ({self.number_of_objects_started} of {self.number_of_objects_total}):"
                 )
                 print(
                     f"        Rendering: {files['png'] if self.args.preview_only else files['model']}"
                 )
+            if job["slice"]:
+                self.queue_slice(job)
+            self.retire_job(job)
+            return
 
-                self.result["models"] += [files["model"]]
-            if not self.args.dryrun and not count_only:
-                if not os.path.exists(files["folder"]):
-                    os.makedirs(files["folder"])
-                logging.info("Render:", cmd)
-                debug("command", cmd)
-
-                out = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                )
-
-                if self.args.show_output or out.returncode != 0:
-                    if out.stdout:
-                        print(out.stdout)
-                    if out.stderr:
-                        print(out.stderr)
-
-                if out.returncode != 0:
-                    print("Error! Aborting this object...")
-                    return
+        if source is not None:
+            # When the original is still being rendered its worker makes the
+            # copy, otherwise it is already built and can be copied now.
+            # (Until it is finished, its thumbnail is copied over later too.)
+            with self.copy_lock:
+                if source["copies"] is not None:
+                    source["copies"] += [job]
+                pending = source["render"] and source["status"] == "planned"
+            if pending:
+                return
+            if source["status"] == "failed":
+                job["status"] = "failed"
+                self.log_done(job, "render", False)
+                return
+            self.copy_object(source, job)
+            return
 
-            return self.args.slice
-        return False
+        if not os.path.exists(files["folder"]):
+            os.makedirs(files["folder"])
 
-    def generate_object(self, cmd, files, count_only):
-        if cmd in self.issued_cmds:
-            # Duplicate command generated, no need to do it again.
+        if not self.args.regen and self.reuse_cached(files, job["key"]):
+            copies = self.set_status(job, "reused")
+            self.log_done(job, "render", True, output=files["model"])
+            self.report([f"        Reused:    {files['model']}"])
+            self.finish_render(job, copies)
             return
 
-        force_slice = self.render_object(cmd, files, count_only)
-        slice(files, count_only, force_slice)
-        self.issued_cmds += [cmd]
+        # The worker queues the slice itself once the model has been rendered.
+        self.submit_work("render", self.run_render, job)
+
+    def execute_plan(self, jobs):
+        generators = set()
+        for job in jobs:
+            if job["status"] == "existing":
+                self.retire_job(job)
+                continue
+            if job["generator"] not in generators:
+                # Scheduling can mix generators, so only say this once.
+                generators.add(job["generator"])
+                self.report(
+                    [f"Running {job['model_format']} generator: {job['generator']}"]
+                )
+            self.execute_job(job)
+        self.wait_for_workers()
 
     def get_cup_str(self, lcups, wcups):
         # Putting "1x1_cups" just doesn't make much sense.
@@ -202,15 +2646,10 @@ class MakeTrays:
             return ""
         return f"_{lcups}x{wcups}_cups"
 
-    def create_incremental_division_variants(
-        self, generator, length, width, height, count_only
-    ):
+    def create_incremental_division_variants(self, generator, length, width, height):
         ldivs = math.floor(length / generator["length_div_minimum_size"])
         wdivs = math.floor(width / generator["width_div_minimum_size"])
 
-        # A record of square trays we've generated, so we don't do duplicates...
-        unique_sq_objects = []
-
         # for ldiv in range(1, ldivs+1, 2 if (scale_units < 25) else 1):
         for ldiv in range(1, ldivs + 1):
 
@@ -226,14 +2665,6 @@ class MakeTrays:
                     # Square cup sizes are handled separately.
                     continue
 
-                # Don't create duplicate trays that are simpel rotated by 90 deg.
-                if length == width:
-                    spec1 = f"{ldiv}x{wdiv}"
-                    spec2 = f"{wdiv}x{ldiv}"
-                    if spec1 in unique_sq_objects or spec2 in unique_sq_objects:
-                        continue
-                    unique_sq_objects += [spec1, spec2]
-
                 ht = height
 
                 folder_path = self.get_output_folder(
@@ -251,20 +2682,18 @@ class MakeTrays:
                         "-D",
                         'Build_Mode="Length_Width_Cups"',
                         "-D",
-                        f"Cup_Along_Length={ldiv}",
+                        f"Cups_Along_Length={ldiv}",
                         "-D",
                         f"Cups_Across_Width={wdiv}",
                     ],
                 )
 
-                self.generate_object(cmd, files, count_only)
+                yield from self.generate_object(generator, cmd, files)
 
     def get_output_path(self, generator, length, width, height):
         return f"{numstr(length)}_{generator['unit_name']}_long/{numstr(width)}_{generator['unit_name']}_wide/{numstr(height)}_{generator['unit_name']}_high"
 
-    def create_square_cup_tray_variations(
-        self, generator, length, width, height, count_only
-    ):
+    def create_square_cup_tray_variations(self, generator, length, width, height):
         cup_sizes = None
         if not generator["square_cup_sizes"]:
             cup_sizes = range(
@@ -299,9 +2728,9 @@ class MakeTrays:
                             f"Square_Cup_Size={cup_size}",
                         ],
                     )
-                    self.generate_object(cmd, files, count_only)
+                    yield from self.generate_object(generator, cmd, files)
 
-    def create_simple_tray(self, generator, length, width, height, count_only):
+    def create_simple_tray(self, generator, length, width, height):
         folder_path = self.get_output_folder(
             generator, self.get_output_path(generator, length, width, height)
         )
@@ -319,14 +2748,14 @@ class MakeTrays:
             ],
         )
 
-        self.generate_object(cmd, files, count_only)
+        yield from self.generate_object(generator, cmd, files)
 
-    def create_openscad_presets(self, generator, count_only):
-        if generator["openscad_presets_dict"] is None:
+    def create_openscad_presets(self, generator):
+        if not generator["openscad_presets_filename"]:
             return
 
         # Check that names in the list are actually in the file and report otherwise
-        for i in generator["openscad_presets_dict"]["parameterSets"]:
+        for i in self.load_presets(generator)["parameterSets"]:
             if generator["openscad_preset_names"]:
                 if not i in generator["openscad_preset_names"]:
                     continue
@@ -342,9 +2771,9 @@ class MakeTrays:
                 None,
                 ["-p", f"{generator['openscad_presets_filename']}", "-P", i],
             )
-            self.generate_object(cmd, files, count_only)
+            yield from self.generate_object(generator, cmd, files)
 
-    def create_custom_layouts(self, generator, length, width, height, count_only):
+    def create_custom_layouts(self, generator, length, width, height):
         if generator["custom_layouts_dict"] is None:
             return
 
@@ -370,7 +2799,7 @@ class MakeTrays:
                     f"Custom_Col_Row_Ratios={expression}",
                 ],
             )
-            self.generate_object(cmd, files, count_only)
+            yield from self.generate_object(generator, cmd, files)
 
         for i in generator["custom_layouts_dict"].get("customDivisions", {}):
             expression = generator["custom_layouts_dict"]["customDivisions"][i][
@@ -394,9 +2823,9 @@ class MakeTrays:
                     f"Custom_Division_List={expression}",
                 ],
             )
-            self.generate_object(cmd, files, count_only)
+            yield from self.generate_object(generator, cmd, files)
 
-    def create_lids(self, generator, length, width, count_only):
+    def create_lids(self, generator, length, width):
         folder_path = self.get_output_folder(
             generator,
             f"{numstr(length)}-{generator['unit_name']}-L/{numstr(width)}-{generator['unit_name']}-W",
@@ -423,7 +2852,7 @@ class MakeTrays:
                     f"Lid_Thickness=0",
                 ],
             )
-            self.generate_object(cmd, files, count_only)
+            yield from self.generate_object(generator, cmd, files)
 
         if not styles or "regular" in styles:
             # Non Recessed Lid
@@ -441,7 +2870,7 @@ class MakeTrays:
                     f'Lid_Style="Finger_Holes"',
                 ],
             )
-            self.generate_object(cmd, files, count_only)
+            yield from self.generate_object(generator, cmd, files)
 
         if not styles or "stackable" in styles:
             # Interlocking Lid
@@ -461,90 +2890,140 @@ class MakeTrays:
                     f"Interlocking_Lid=true",
                 ],
             )
-            self.generate_object(cmd, files, count_only)
-
-    def enumerate_tray_sizes(self, generator):
-        max_length = 0
-        max_width = 0
+            yield from self.generate_object(generator, cmd, files)
 
-        if generator["dimensions"]:
-            sizes = []
-            for elem in generator["dimensions"]:
-                lxw = elem.split("x")
-                if len(lxw) < 2:
-                    print(
-                        "Invalid dimension specified for 'dimensions'. Need LxW or LxWxH, got",
-                        elem,
-                    )
+    def parse_dimension(self, elem):
+        lxw = elem.split("x")
+        if len(lxw) < 2:
+            print(
+                "Invalid dimension specified for 'dimensions'. Need LxW or LxWxH, got",
+                elem,
+            )
 
-                length = float(lxw[0])
-                width = float(lxw[1])
+        length = float(lxw[0])
+        width = float(lxw[1])
 
-                # Since we assume length is the longest dimension, swap these is the user
-                # enters it this way.
-                if width > length:
-                    tmp = length
-                    length = width
-                    width = tmp
+        # Since we assume length is the longest dimension, swap these is the user
+        # enters it this way.
+        if width > length:
+            tmp = length
+            length = width
+            width = tmp
 
-                max_length = max(max_length, length)
-                max_width = max(max_width, width)
+        return lxw, length, width
 
-                if len(lxw) == 2:
-                    if not generator["heights"]:
-                        print(
-                            "When using 'dimensions' with LxW expressions, you must also provide heights using 'heights', or use LxWxH expressions"
-                        )
-                        sys.exit(1)
-                    for height in generator["heights"]:
-                        sizes += [[length, width, height]]
+    def enumerate_tray_sizes(self, generator):
+        # The largest dimensions are needed up front (for square cup sizes), but
+        # the sizes themselves are produced lazily since a sweep can be huge.
+        if generator["dimensions"]:
+            dims = [self.parse_dimension(elem) for elem in generator["dimensions"]]
 
-                if len(lxw) == 3:
-                    sizes += [[length, width, float(lxw[2])]]
+            if not generator["heights"] and [d for d in dims if len(d[0]) == 2]:
+                print(
+                    "When using 'dimensions' with LxW expressions, you must also provide heights using 'heights', or use LxWxH expressions"
+                )
+                sys.exit(1)
 
             # TODO: What if we fall thru here? Is that a valid and useful case
-            generator["max_length"] = max_length
-            generator["max_width"] = max_width
-            return sizes
+            generator["max_length"] = max([d[1] for d in dims], default=0)
+            generator["max_width"] = max([d[2] for d in dims], default=0)
+            return self.iterate_dimensions(generator, dims)
 
         else:
-            sizes = []
+            generator["max_length"] = 0
+            generator["max_width"] = 0
             if generator["lengths"] and generator["widths"]:
-                for length in generator["lengths"]:
-                    for width in generator["widths"]:
+                generator["max_length"] = max(generator["lengths"])
+                generator["max_width"] = max(generator["widths"])
+            return self.iterate_lengths_and_widths(generator)
 
-                        max_length = max(max_length, length)
-                        max_width = max(max_width, width)
+    def iterate_dimensions(self, generator, dims):
+        for lxw, length, width in dims:
+            if len(lxw) == 2:
+                for height in generator["heights"]:
+                    yield [length, width, height]
 
-                        if width > length:
-                            # This prevents duplicate trays
-                            continue
-                        for height in generator["heights"]:
-                            sizes += [[length, width, height]]
+            if len(lxw) == 3:
+                yield [length, width, float(lxw[2])]
 
-            generator["max_length"] = max_length
-            generator["max_width"] = max_width
-            return sizes
+    def iterate_lengths_and_widths(self, generator):
+        if not generator["lengths"] or not generator["widths"]:
+            return
+
+        for length in generator["lengths"]:
+            for width in generator["widths"]:
+                if width > length:
+                    # This prevents duplicate trays
+                    continue
+                for height in generator["heights"]:
+                    yield [length, width, height]
 
-    def enumerate_objects(self, count_only):
+    def enumerate_objects(self):
+        # Produce the work plan lazily: one job record per object, holding its
+        # command, files, and what needs to be done for it.
+        self.issued_cmds = {}
+        for gen in self.get_active_generators():
+            yield from self.enumerate_generator(gen)
+
+    def get_active_generators(self):
         gen_list = self.config["gen_list"]
+        generators = []
         if self.generator_configs:
             for gen in self.generator_configs:
                 if gen["name"] == "root":
                     continue
                 if gen_list is not None and gen["name"] not in gen_list:
                     continue
-                self.enumerate_generator(gen, count_only)
-
-    def enumerate_generator(self, generator, count_only):
-        global args
-        if count_only:
-            print(
-                f"Generator '{generator['name']}' is using '{generator['unit_name']}' units"
-            )
-
-        if not count_only:
-            print(f"Running {generator['model_format']} generator: {generator['name']}")
+                generators += [gen]
+        return generators
+
+    def get_output_folders(self):
+        folders = []
+        for gen in self.get_active_generators():
+            if gen["output_folder"] not in folders:
+                folders += [gen["output_folder"]]
+        return folders
+
+    def resume_jobs(self):
+        # Rebuild the unfinished jobs straight from the journals, without
+        # planning the whole tree again.
+        sources = {}
+        for folder in self.get_output_folders():
+            for record, stages in self.get_journal(folder).unfinished():
+                job = {
+                    "generator": record["generator"],
+                    "model_format": record["model_format"],
+                    "cmd": record["cmd"],
+                    "key": record["key"],
+                    "files": record["files"],
+                    "render": "render" in stages,
+                    "slice": "slice" in stages,
+                    "thumbnail_cmd": record["thumbnail_cmd"]
+                    if "thumbnail" in stages
+                    else None,
+                    "export": record.get("export"),
+                    "timeout": record.get("timeout"),
+                    "retry_facet_scale": record.get("retry_facet_scale"),
+                    "fast_path": record.get("fast_path", False),
+                    "status": "planned",
+                    "source": None,
+                    "copies": [],
+                    "cmd_key": None,
+                    "cost": self.cost_model.predict(record["cmd"])
+                    if "render" in stages
+                    else None,
+                }
+                if job["render"]:
+                    # Identical objects still only need rendering once.
+                    job["source"] = sources.get(job["key"])
+                    if job["source"] is None:
+                        sources[job["key"]] = job
+                yield job
+
+    def enumerate_generator(self, generator):
+        print(
+            f"Generator '{generator['name']}' is using '{generator['unit_name']}' units"
+        )
 
         sizes = self.enumerate_tray_sizes(generator)
 
@@ -559,26 +3038,26 @@ class MakeTrays:
                 or generator["make_divisions"]
             ):
                 if generator["make_square_cups"]:
-                    self.create_square_cup_tray_variations(
-                        generator, length, width, height, count_only
+                    yield from self.create_square_cup_tray_variations(
+                        generator, length, width, height
                     )
 
                 if generator["make_divisions"]:
-                    self.create_incremental_division_variants(
-                        generator, length, width, height, count_only
+                    yield from self.create_incremental_division_variants(
+                        generator, length, width, height
                     )
 
-                self.create_custom_layouts(generator, length, width, height, count_only)
+                yield from self.create_custom_layouts(generator, length, width, height)
 
             else:
-                self.create_simple_tray(generator, length, width, height, count_only)
+                yield from self.create_simple_tray(generator, length, width, height)
 
             if generator["make_lids"]:
                 if not [length, width] in handled_lids:
-                    self.create_lids(generator, length, width, count_only)
-                    handled_lids += [length, width]
+                    yield from self.create_lids(generator, length, width)
+                    handled_lids += [[length, width]]
 
-        self.create_openscad_presets(generator, count_only)
+        yield from self.create_openscad_presets(generator)
 
     # https://stackoverflow.com/a/27434050/45206
     class LoadFromFile(argparse.Action):
@@ -720,7 +3199,7 @@ class MakeTrays:
             nargs="?",
             default=False,
             const=True,
-            help="Dry run.  Just print the commands that will be executed.",
+            help="Dry run.  Just print the commands that will be executed.  To be quick, it doesn't check the inputs of models that already exist, so they count as up to date, and only objects with exactly the same command are copies.",
         )
 
         g0.add_argument(
@@ -732,6 +3211,93 @@ class MakeTrays:
             help="Like --dryrun, but just report the count of trays that would be generated.",
         )
 
+        g0.add_argument(
+            "--stream",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Start rendering the first tray as soon as it is enumerated, instead of planning and counting everything first.  There is no confirmation prompt and the total is not known up front, but memory use stays flat for very large size sweeps.",
+        )
+
+        g0.add_argument(
+            "--resume",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Pick up an interrupted or partly failed build where it left off.  Every job is recorded in .build_journal.jsonl in the output folder, and with this flag only the jobs that did not finish (or failed) are run again, without checking the rest of the library.",
+        )
+
+        g0.add_argument(
+            "--schedule",
+            choices=["config", "cost", "longest"],
+            default="config",
+            help="The order to build objects in.  \"config\" builds each generator in turn, in the order of the config file.  \"cost\" orders the objects of all generators by their expected render time (from past builds, or from their size and number of cups) and starts the most expensive first, so that with several --jobs the build doesn't end waiting on one slow tray.  \"longest\" is another name for \"cost\".  Not used with --stream.",
+        )
+
+        g0.add_argument(
+            "--link_mode",
+            choices=["none", "hardlink", "reflink", "symlink"],
+            default="none",
+            help='How finished models, thumbnails and gcode are placed in the output folder.  "none" writes every file separately.  The other modes keep each distinct file once under .blobs in the output folder, named by its contents, and put a hard link, reflink (a copy sharing the same disk blocks, on file systems that support it), or symlink to it in the output tree, so identical files from different generators only take up space once.',
+        )
+
+        g0.add_argument(
+            "--clean_blobs",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Remove the files under .blobs in the output folder(s) that nothing in the output tree refers to any more (after outputs were deleted or rebuilt), then exit.  With -d, only list them.",
+        )
+
+        g0.add_argument(
+            "--serve",
+            type=str,
+            default=None,
+            metavar="HOST:PORT",
+            help="Plan the build here, but hand every render, thumbnail and slice to --worker processes that connect on this address.  Workers can be on other machines, they are sent the files they need and send back what they make.  -j sets how many objects are handed out at once, so set it to the total of the workers' -j.",
+        )
+
+        g0.add_argument(
+            "--worker",
+            type=str,
+            default=None,
+            metavar="HOST:PORT",
+            help="Run as a worker for a --serve coordinator at this address, running -j tools at a time until the coordinator is done.",
+        )
+
+        g0.add_argument(
+            "--authkey",
+            type=str,
+            default=None,
+            help="The shared secret that --serve and --worker use to authenticate each other, required with either of them.  Anyone who has it and can reach the coordinator's address can run commands on the coordinator and the workers, so pick one that is hard to guess.",
+        )
+
+        g0.add_argument(
+            "--lease_time",
+            type=float,
+            default=60,
+            help="How long (in seconds) a --serve coordinator waits to hear from a worker before handing its job to another worker.  Workers check in several times per lease while they are busy.",
+        )
+
+        g0.add_argument(
+            "--report",
+            type=str,
+            default=None,
+            help="Where to write the build report, with the time, CPU and peak memory used by every render, slice and thumbnail, the slowest objects, and totals per generator and Build_Mode.  A name ending in .csv gives just the per object rows as CSV.  By default a build_report.json is written to each output folder.",
+        )
+
+        g0.add_argument(
+            "--list_plan",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Print what would be done for each object (render, copy, slice, thumbnail, or nothing when it is up to date, judged as with --dryrun) in the order it would be done, then exit.  Like --count_only this doesn't run OpenSCAD or write anything, so it is quick enough for scripts and hooks.",
+        )
+
         g0.add_argument(
             "--doit",
             type=str2bool,
@@ -751,19 +3317,99 @@ class MakeTrays:
             help="Only generate preview images (faster for testing).  This is fairly fast so you can visually review what will be generated and sliced.",
         )
 
+        g0.add_argument(
+            "--skip_thumbnails",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Do not create png thumbnails of the models.  Thumbnails are normally drawn from each exported model in a separate, low priority, pass after it has been rendered.  This can also be set for individual generators in a config file.",
+        )
+
+        g0.add_argument(
+            "--thumbnail_size",
+            type=str,
+            help='The size of png thumbnails and preview images, as "WxH" in pixels. The default is 800x600.',
+        )
+
+        g0.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="The number of OpenSCAD processes to run at the same time.  Each tray is rendered by its own process, so on a machine with many cores a large library builds many times faster with more jobs.",
+        )
+
+        g0.add_argument(
+            "--thumbnail_jobs",
+            type=int,
+            help="The number of thumbnail processes to run at the same time.  Defaults to the same value as --jobs.",
+        )
+
+        g0.add_argument(
+            "--backend",
+            choices=backends,
+            help='The OpenSCAD geometry backend to render with.  "manifold" is many times faster than "cgal" for the unions and differences trays are made of, but only newer OpenSCAD builds have it.  "auto" (the default) uses manifold when the installed OpenSCAD has it (found from its --help, asked along with its --version and remembered until the executable changes) and OpenSCAD\'s own default otherwise.  "default" passes no backend option at all.  Models built with one backend are rebuilt when another one is used.  This can also be set for individual generators in a config file.',
+        )
+
+        g0.add_argument(
+            "--openscad_flags",
+            type=str,
+            help='Extra options to pass to OpenSCAD for every render, as one quoted string (e.g. --openscad_flags="--hardwarnings").  This can also be set for individual generators in a config file, as a string or a list.',
+        )
+
+        g0.add_argument(
+            "--timeout",
+            type=float,
+            help="The longest, in seconds, that OpenSCAD may take to render one object.  When it takes longer it is killed (along with anything it started), the object is recorded as failed in the build report and journal, and the build carries on with the next one.  This can also be set for individual generators in a config file.",
+        )
+
+        g0.add_argument(
+            "--retry_facet_scale",
+            type=float,
+            help="Render an object that hit --timeout once more, with the facets of all round parts scaled by this (e.g. 0.5 for half as many), instead of giving up on it.  The model is recorded as built with fewer facets, so the next run tries it at full quality again.  This can also be set for individual generators in a config file.",
+        )
+
+        g0.add_argument(
+            "--time_budget",
+            type=float,
+            help="The longest, in seconds, that the whole build may take.  Renders still running when it runs out are killed, and the objects not yet started are recorded as failed, so --resume can finish them later.",
+        )
+
+        g0.add_argument(
+            "--slice_jobs",
+            type=int,
+            help="The number of slicer processes to run at the same time.  Models are sliced as soon as they are rendered, while other trays are still rendering.  Defaults to the same value as --jobs.",
+        )
+
         g0.add_argument(
             "--model_format",
             type=str,
             help="Instruct openscad to export the rendered tray in this format.  Using 3MF is highly recommeneded.  Using STL is not recommended because OpenSCAD has trouble generating well-formed STL files. You may need to run repair utilities on it.  You can specify any other format supported by OpenSCAD to meet your needs.",
         )
 
+        g0.add_argument(
+            "--mesh_format",
+            choices=list(mesh_formats),
+            help='Post-process each exported model, in the render workers, to make it smaller and quicker to copy and slice.  "binary_stl" writes a binary STL, "3mf" writes a 3MF compressed with deflate, and both merge duplicate vertices.  OpenSCAD still exports in --model_format, which can be different (e.g. export stl and keep 3mf).  "none" (the default) keeps the models as OpenSCAD exports them.  This can also be set for individual generators in a config file.',
+        )
+
+        g0.add_argument(
+            "--fast_path",
+            type=str2bool,
+            nargs="?",
+            default=False,
+            const=True,
+            help="Build the plainest trays (Just_the_Tray, Square_Cups and Length_Width_Cups, in stl or 3mf, with no lid, box top, insert, finger slots or corner posts) in Python, straight from their settings, instead of running OpenSCAD.  It is the same shape, built in milliseconds instead of seconds.  Everything else still goes to OpenSCAD.  Needs numpy to be installed.  This can also be set for individual generators in a config file.",
+        )
+
         g0.add_argument(
             "--regen",
             type=str2bool,
             nargs="?",
             default=False,
             const=True,
-            help="Force regeneration even if file exists.  Normally model files will not be re-rendered if they already exist, saving time.  But if you need to regenerate the file to effect a change, you can set this flag.",
+            help="Force regeneration even if file exists.  Normally model files will not be re-rendered if they already exist and were built from the same OpenSCAD command, tray_generator.scad source, and OpenSCAD version (recorded in .render_cache.json in the output folder).  Models built before the render cache existed are assumed to be up to date.  Set this flag to regenerate everything anyway.",
         )
 
         g0.add_argument(
@@ -897,6 +3543,11 @@ class MakeTrays:
         )
 
         self.args = parser.parse_args()
+        if self.args.schedule == "longest":
+            # The name this had before it used the cost model.
+            self.args.schedule = "cost"
+        if (self.args.serve or self.args.worker) and not self.args.authkey:
+            parser.error("--serve and --worker need a shared secret in --authkey")
 
     def determine_units(self, config):
 
@@ -925,49 +3576,86 @@ class MakeTrays:
 
         print(f"Reading application data from: {filename}")
 
-        with open(filename) as g:
-            self.global_config = yaml.safe_load(g)
-
-    def get_config_value(
-        self, key, arg=None, default=None, asList=False, asFloat=False
-    ):
-        result = None
-
-        # First look in the global configuration
-        if self.global_config and self.global_config.get(key):
-            result = self.global_config.get(key)
-
-        # Then look in the top level configusation of the provided config file
-        if self.top_config_dict and self.top_config_dict.get(key):
-            result = self.top_config_dict.get(key)
-
-        # Next look in the second level configuration.
-        if self.subconfig and self.subconfig.get(key):
-            result = self.subconfig.get(key)
+        self.global_config = load_config_file(filename)
 
+    def get_config_value(self, key, arg=None, default=None):
         # cli params, if provided, override all others...
         if arg:
             return arg
 
-        # Covert our result to a list if needed.
-        if result is not None and type(result) is not list and asList:
-            if type(result) == str:
-                result = result.split()
-            else:
-                result = [result]
-
-        # Convert our result to float if needed.
-        if result is not None and asFloat:
-            if type(result) is list:
-                result = [float(i) for i in result]
-            else:
-                result = float(result)
-
+        # The global, config file, and generator settings, already merged and
+        # converted.
+        result = self.layer.get(key)
         if result is not None:
             return result
 
         return default
 
+    def resolve_backend(self, openscad_exec, backend):
+        if backend == "auto":
+            # The fast backend when this OpenSCAD has it, otherwise its default.
+            return get_backend_args(openscad_exec, "manifold") or []
+        args = get_backend_args(openscad_exec, backend)
+        if args is None:
+            if (openscad_exec, backend) not in self.backend_warnings:
+                self.backend_warnings.add((openscad_exec, backend))
+                print(
+                    f"Warning: {openscad_exec} has no {backend} backend, so its default backend is used."
+                )
+            return []
+        return args
+
+    def has_numpy(self):
+        if self.numpy is None:
+            self.numpy = has_numpy()
+            if not self.numpy:
+                print(
+                    "Warning: numpy is not installed, so the fast path is off and every object is rendered with OpenSCAD."
+                )
+        return self.numpy
+
+    def merge_layers(self, *layers):
+        # Later layers override earlier ones, but only with values that are
+        # actually set: global configuration, then the top level of the config
+        # file, then the generator's own section.  Values are converted to
+        # the type they are used as here, so lookups don't have to.
+        merged = {}
+        for layer in layers:
+            if isinstance(layer, types.MappingProxyType):
+                # Already merged, and converted.
+                merged.update(layer)
+            elif layer:
+                for key, value in layer.items():
+                    if value:
+                        merged[key] = resolve_config_value(key, value)
+        return types.MappingProxyType(merged)
+
+    def resolve_exec(self, openscad_exec):
+        # Every generator usually names the same executable, so only look for
+        # each one once.
+        if openscad_exec not in self.resolved_execs:
+            self.resolved_execs[openscad_exec] = os.path.exists(
+                openscad_exec
+            ) or bool(shutil.which(openscad_exec))
+        return self.resolved_execs[openscad_exec]
+
+    def load_presets(self, generator):
+        filename = generator["openscad_presets_filename"]
+        if filename not in self.preset_files:
+            with open(filename) as f:
+                self.preset_files[filename] = json.load(f)
+
+        presets = self.preset_files[filename]
+        for i in generator["openscad_preset_names"] or []:
+            if (filename, i) in self.checked_presets:
+                continue
+            self.checked_presets.add((filename, i))
+            if not i in presets["parameterSets"]:
+                print(
+                    f"Warning: OpenSCAD preset named '{i}' is not present in {filename}"
+                )
+        return presets
+
     def get_configuration(self, subconfig=None):
         if not self.global_config:
             self.get_global_config()
@@ -981,12 +3669,17 @@ class MakeTrays:
             print(f"Reading configuration from: {filename}")
 
             if filename:
-                with open(filename) as f:
-                    self.top_config_dict = yaml.safe_load(f)
+                self.top_config_dict = load_config_file(filename)
 
-        self.subconfig = None
+        # What generators inherit is the same for all of them, so it is only
+        # merged once.
+        if self.base_layer is None:
+            self.base_layer = self.merge_layers(
+                self.global_config, self.top_config_dict
+            )
+        self.layer = self.base_layer
         if subconfig:
-            self.subconfig = subconfig
+            self.layer = self.merge_layers(self.base_layer, subconfig)
 
         config = {}
 
@@ -997,10 +3690,25 @@ class MakeTrays:
         config["openscad_exec"] = self.get_config_value(
             "openscad_exec", self.args.oscad, "openscad"
         )
+        if type(config["openscad_exec"]) is list:
+            # --oscad takes the words of a path with spaces in it.
+            config["openscad_exec"] = " ".join(config["openscad_exec"])
         config["unit_name"] = self.get_config_value("units", self.args.units, "in")
         config["model_format"] = self.get_config_value(
             "model_format", self.args.model_format, "3mf"
         )
+        config["mesh_format"] = self.get_config_value(
+            "mesh_format", self.args.mesh_format, "none"
+        )
+        if config["mesh_format"] not in mesh_formats:
+            sys.exit(
+                f"Invalid mesh format: {config['mesh_format']}. Use one of: {', '.join(mesh_formats)}"
+            )
+        # OpenSCAD exports in model_format, and the mesh format, if there is
+        # one, is what ends up in the output folder.
+        config["export_format"] = config["model_format"]
+        if config["mesh_format"] != "none":
+            config["model_format"] = mesh_formats[config["mesh_format"]]
         config["output_folder"] = self.get_config_value(
             "output_folder", self.args.output_folder
         )
@@ -1008,64 +3716,64 @@ class MakeTrays:
         config["output_subfolder"] = self.get_config_value("output_subfolder")
 
         # Check that we can resolve an OpenSCAD executable
-        if not os.path.exists(config["openscad_exec"]):
-            openscad_path = shutil.which(config["openscad_exec"])
-            if not openscad_path:
-                sys.exit(
-                    "An OpenSCAD executable could not be resolved!\nCheck your yaml config file, --oscad param, or your PATH"
-                )
+        if not self.resolve_exec(config["openscad_exec"]):
+            sys.exit(
+                "An OpenSCAD executable could not be resolved!\nCheck your yaml config file, --oscad param, or your PATH"
+            )
 
-        if not self.args.count_only and config["output_folder"] is None:
+        config["backend"] = self.get_config_value("backend", self.args.backend, "auto")
+        if config["backend"] not in backends:
+            sys.exit(
+                f"Invalid backend: {config['backend']}. Use one of: {', '.join(backends)}"
+            )
+        if self.args.dryrun:
+            # Planning commands don't run OpenSCAD, so don't ask it either.
+            config["backend_args"] = []
+        else:
+            config["backend_args"] = self.resolve_backend(
+                config["openscad_exec"], config["backend"]
+            )
+        config["openscad_flags"] = self.get_config_value(
+            "openscad_flags", self.args.openscad_flags, []
+        )
+        if type(config["openscad_flags"]) is str:
+            config["openscad_flags"] = config["openscad_flags"].split()
+
+        if (
+            not self.args.count_only
+            and not self.args.worker
+            and config["output_folder"] is None
+        ):
             sys.exit(
                 "You need to specify an output folder (-o <folder>) so I know where to put everything."
             )
 
-        config["dimensions"] = self.get_config_value(
-            "dimensions", self.args.dimensions, asList=True
-        )
-        config["lengths"] = self.get_config_value(
-            "lengths", self.args.lengths, asList=True, asFloat=True
-        )
-        config["widths"] = self.get_config_value(
-            "widths", self.args.widths, asList=True, asFloat=True
-        )
-        config["heights"] = self.get_config_value(
-            "heights", self.args.heights, asList=True, asFloat=True
-        )
+        config["dimensions"] = self.get_config_value("dimensions", self.args.dimensions)
+        config["lengths"] = self.get_config_value("lengths", self.args.lengths)
+        config["widths"] = self.get_config_value("widths", self.args.widths)
+        config["heights"] = self.get_config_value("heights", self.args.heights)
 
         self.determine_units(config)
         self.setup_other_dimensions(config)
         self.setup_other_params(config)
 
-        config["openscad_presets_dict"] = None
-        filename = self.get_config_value(
+        # The presets file itself is only read when the generator is run.
+        config["openscad_presets_filename"] = self.get_config_value(
             "openscad_presets_file", self.args.openscad_presets_file
         )
-
+        filename = config["openscad_presets_filename"]
         if filename and not os.path.exists(filename):
             sys.exit(f"Specified openscad preset file does not exist: {filename}")
 
-        if filename:
-            f = open(filename)
-            config["openscad_presets_dict"] = json.load(f)
-            config["openscad_presets_filename"] = filename
-
         config["openscad_preset_names"] = self.get_config_value(
-            "openscad_preset_names", self.args.openscad_preset_names, asList=True
+            "openscad_preset_names", self.args.openscad_preset_names
         )
 
-        if not config["openscad_presets_dict"] and config["openscad_preset_names"]:
+        if not filename and config["openscad_preset_names"]:
             print(
                 "Warning: Openscad presets were specified, but no OpenSCAD preset file was specified"
             )
 
-        if config["openscad_presets_dict"] and config["openscad_preset_names"]:
-            for i in config["openscad_preset_names"]:
-                if not i in config["openscad_presets_dict"]["parameterSets"]:
-                    print(
-                        f"Warning: OpenSCAD preset named '{i}' is not present in {config['openscad_presets_filename']}"
-                    )
-
         config["custom_layouts_dict"] = self.get_config_value("custom_layouts")
 
         # TODO check layout names against those in the file
@@ -1078,7 +3786,7 @@ class MakeTrays:
             config["length_div_minimum_size"] = 1 if config["scale_units"] > 25 else 3
 
         config["length_skip_divs"] = self.get_config_value(
-            "length_skip_divs", self.args.length_skip_divs, [], asList=True
+            "length_skip_divs", self.args.length_skip_divs, []
         )
 
         config["width_div_minimum_size"] = self.get_config_value(
@@ -1089,7 +3797,7 @@ class MakeTrays:
             config["width_div_minimum_size"] = 1 if config["scale_units"] > 25 else 3
 
         config["width_skip_divs"] = self.get_config_value(
-            "width_skip_divs", self.args.width_skip_divs, [], asList=True
+            "width_skip_divs", self.args.width_skip_divs, []
         )
 
         config["flat"] = self.get_config_value("flat", self.args.flat, False)
@@ -1099,7 +3807,7 @@ class MakeTrays:
         )
 
         config["square_cup_sizes"] = self.get_config_value(
-            "square_cup_sizes", self.args.square_cup_sizes, asList=True
+            "square_cup_sizes", self.args.square_cup_sizes
         )
 
         config["make_divisions"] = self.get_config_value(
@@ -1110,13 +3818,34 @@ class MakeTrays:
             "make_lids", self.args.make_lids, False
         )
 
-        config["lid_styles"] = self.get_config_value(
-            "lid_styles", self.args.lid_styles, asList=True
+        config["lid_styles"] = self.get_config_value("lid_styles", self.args.lid_styles)
+
+        config["gen_list"] = self.get_config_value("gen_list", self.args.gen_list, None)
+
+        config["skip_thumbnails"] = self.get_config_value(
+            "skip_thumbnails", self.args.skip_thumbnails, False
+        )
+
+        config["thumbnail_size"] = self.get_config_value(
+            "thumbnail_size", self.args.thumbnail_size, "800x600"
         )
+        if not re.match(r"^\d+[xX]\d+$", str(config["thumbnail_size"])):
+            sys.exit(
+                f"Invalid thumbnail size: {config['thumbnail_size']}. Use WxH, like 800x600."
+            )
 
-        config["gen_list"] = self.get_config_value(
-            "gen_list", self.args.gen_list, None, asList=True
+        config["fast_path"] = str2bool(
+            self.get_config_value("fast_path", self.args.fast_path, False)
         )
+        if config["fast_path"] and not self.has_numpy():
+            config["fast_path"] = False
+
+        for name in ["timeout", "retry_facet_scale"]:
+            config[name] = self.get_config_value(name, getattr(self.args, name))
+            if config[name] is not None:
+                if not isfloat(config[name]) or float(config[name]) <= 0:
+                    sys.exit(f"Invalid {name}: {config[name]}. Use a number above 0.")
+                config[name] = float(config[name])
 
         config["file_prefix"] = self.get_config_value("file_prefix", None, "tray_")
         if config["file_prefix"] == "none":
@@ -1126,14 +3855,20 @@ class MakeTrays:
 
     def setup_other_params(self, config):
         global oscad_variables
-        other = self.get_config_value("other_oscad_params", default=[], asList=True)
+        other = self.get_config_value("other_oscad_params", default=[])
+
+        # Generators mostly inherit the same parameters, so each set of them
+        # is only checked once.
+        if tuple(other) in self.checked_params:
+            config["other_oscad_params"] = self.checked_params[tuple(other)]
+            return
 
         params = []
         for param in other:
             pname, pvalue = param.split("=")
             # Check that this is known script parameter
-            if not pname in oscad_variables["list"]:
-                suggestions = process.extract(pname, oscad_variables["list"], limit=1)
+            if not pname in oscad_variables["names"]:
+                suggestions = get_suggestions(pname, oscad_variables["names"])
                 if suggestions:
                     sys.exit(
                         f"Oops, other_oscad_params:{pname} is not a known parameter.\nDid you mean: {suggestions[0][0]}"
@@ -1146,9 +3881,9 @@ class MakeTrays:
             # If we know the valid options for this paramters, check the value.
             if oscad_variables["options"][pname]:
                 if not pvalue in oscad_variables["options"][pname]:
-                    print(oscad_variables["options"][pname])
-                    suggestions = process.extract(
-                        pvalue, oscad_variables["options"][pname], limit=1
+                    print(sorted(oscad_variables["options"][pname]))
+                    suggestions = get_suggestions(
+                        pvalue, oscad_variables["options"][pname]
                     )
                     if suggestions:
                         sys.exit(
@@ -1161,6 +3896,7 @@ class MakeTrays:
 
             params += ["-D", param]
 
+        self.checked_params[tuple(other)] = params
         config["other_oscad_params"] = params
 
     def setup_other_dimensions(self, config):
@@ -1193,7 +3929,7 @@ class MakeTrays:
                 div_t = wall_dims[2]
 
         interlock_dims = self.get_config_value(
-            "interlock_dimensions", self.args.interlock_dimensions, asList=True
+            "interlock_dimensions", self.args.interlock_dimensions
         )
         if interlock_dims is not None:
             if len(interlock_dims) >= 1:
@@ -1235,13 +3971,53 @@ class MakeTrays:
         # Count of object sliced while running, for progrss reporting.
         self.number_of_objects_sliced = 0
 
-        self.issued_cmds = []
+        self.issued_cmds = {}
+        self.plan = []
+
+        # Count of objects handed to a worker so far, for progress reporting.
+        self.number_of_objects_started = 0
+        self.output_lock = threading.Lock()
+        self.work_lock = threading.Lock()
+        self.copy_lock = threading.Lock()
+        self.work_pools = {}
+        self.work_errors = []
+        # Limits how many renders can be queued ahead of the workers.
+        self.render_slots = None
+
+        # Render caches, one per output folder.
+        self.render_caches = {}
+        # Content addressed stores for --link_mode, one per output folder.
+        self.blob_stores = {}
+        self.journals = {}
+        self.cost_model = CostModel()
+        self.renders_done = 0
+        self.predicted_done = 0.0
+        self.predicted_total = 0.0
+        self.actual_done = 0.0
+        self.timings = []
+        self.build_started = time.time()
+        # Set when --serve hands the tools to run to --worker processes.
+        self.job_server = None
+        self.job_manager = None
+        self.job_thread = None
 
         self.make_args()
 
         self.top_config_dict = {}
 
         self.global_config = None
+        # The merged configuration layers, see get_configuration().
+        self.base_layer = None
+        self.layer = None
+        # Results of checks that only need doing once, not per generator.
+        self.resolved_execs = {}
+        self.preset_files = {}
+        self.checked_presets = set()
+        self.checked_params = {}
+        self.backend_warnings = set()
+        self.numpy = None
+        if self.args.count_only or self.args.list_plan:
+            self.args.dryrun = True
         self.config = self.get_configuration()
         self.config["name"] = "root"
         self.generator_configs = [self.config]
@@ -1251,8 +4027,18 @@ class MakeTrays:
                 config["name"] = cfg
                 self.generator_configs += [config]
 
-        if self.args.count_only:
-            self.args.dryrun = True
+        if self.args.jobs < 1:
+            sys.exit("The number of jobs (-j/--jobs) must be at least 1.")
+
+        self.render_slots = threading.BoundedSemaphore(self.args.jobs * 4)
+
+        if self.args.slice_jobs is not None and self.args.slice_jobs < 1:
+            sys.exit("The number of slice jobs (--slice_jobs) must be at least 1.")
+
+        if self.args.thumbnail_jobs is not None and self.args.thumbnail_jobs < 1:
+            sys.exit(
+                "The number of thumbnail jobs (--thumbnail_jobs) must be at least 1."
+            )
 
         self.max_length = 0
         self.max_width = 0
@@ -1262,12 +4048,59 @@ class MakeTrays:
         self.number_of_objects_generated = 0
         self.number_of_objects_sliced = 0
         self.number_of_objects_total = 0
+        self.build_started = time.time()
+        if not self.args.dryrun:
+            # Planning commands don't show a prediction, so don't read the history.
+            self.cost_model = self.load_cost_model()
+
+        if self.args.clean_blobs:
+            self.clean_blobs()
+            return
 
-        print("Accumulating work units...")
+        if self.args.resume:
+            print("Reading the build journal...")
+            jobs = self.count_jobs(self.resume_jobs())
+        else:
+            print("Accumulating work units...")
+            jobs = self.count_jobs(self.enumerate_objects())
+
+        if self.args.stream and not (self.args.count_only or self.args.list_plan):
+            # Nothing is planned up front, the workers start on the first job
+            # as soon as it is enumerated.  The total is not known until the end.
+            self.number_of_objects_total = "?"
+            if self.args.serve:
+                self.start_job_server()
+            try:
+                self.execute_plan(jobs)
+            finally:
+                self.stop_job_server()
+                self.save_render_caches()
+                self.write_build_reports()
+                self.close_journals()
+            self.compact_journals()
+            self.print_summary()
+            return
 
-        # First rip through the generator and just count the number
-        # of elements that will be generated.
-        self.enumerate_objects(count_only=True)
+        # Plan everything once.  The counts, the confirmation prompt, and the
+        # real work all come from this plan.
+        if self.args.count_only:
+            # Only the counts are needed, so the jobs are not kept.
+            self.plan = []
+            for job in jobs:
+                self.number_of_objects_generated += job["render"]
+                self.number_of_objects_sliced += job["slice"]
+        else:
+            self.plan = list(jobs)
+            self.number_of_objects_generated = len(
+                [j for j in self.plan if j["render"]]
+            )
+            self.number_of_objects_sliced = len([j for j in self.plan if j["slice"]])
+
+        if self.args.list_plan:
+            if self.args.schedule == "cost":
+                self.plan = self.schedule_by_cost(self.plan)
+            self.list_plan()
+            return
 
         count_summary = (
             f"Number of objects declared:         {self.number_of_objects}\n"
@@ -1280,6 +4113,10 @@ class MakeTrays:
             print(count_summary)
             sys.exit(0)
 
+        if self.args.resume and self.number_of_objects == 0:
+            print("Nothing to resume, every journaled job has finished.")
+            sys.exit(0)
+
         if self.number_of_objects == 0:
             print(count_summary)
             message = 'This probably wasn\'t what you were expecting!\n\
@@ -1289,12 +4126,22 @@ For instance, try "--dimension 8x4x1"\n\
 Use "-h" to get more help.'
             sys.exit(message)
 
-        if self.number_of_objects_generated == 0 and self.number_of_objects_sliced == 0:
+        # Thumbnails that are missing still count as work to do.
+        if not [j for j in self.plan if j["status"] != "existing"]:
+            # Keep any render keys that were adopted while planning.
+            self.save_render_caches()
             print("All your work is already done!")
             print("Use --regen and/or --reslice if you need to.")
             print(count_summary)
             sys.exit(0)
 
+        if self.args.schedule == "cost":
+            self.plan = self.schedule_by_cost(self.plan)
+
+        predicted = self.predict_build_time()
+        if predicted is not None:
+            count_summary += f"Predicted build time:               {format_duration(predicted)} (from {self.cost_model.samples} past renders)\n"
+
         if not self.args.dryrun and self.number_of_objects > 0 and not self.args.doit:
             print("This is what is going to happen:")
             print(count_summary)
@@ -1304,17 +4151,227 @@ Use "-h" to get more help.'
                 print("OK, maybe next time...")
                 sys.exit(0)
 
-        # Record the total since running the generator will still
-        # increment the number_of_objects variable.
-        self.number_of_objects_total = self.number_of_objects_generated
+        # Record the total for progress reporting.  Copies of identical objects
+        # are not rendered, so they are not part of it.
+        self.number_of_objects_total = len(
+            [j for j in self.plan if j["render"] and j["source"] is None]
+        )
 
         # Reset these so the report properly during generation
         self.number_of_objects_generated = 0
         self.number_of_objects_sliced = 0
+        self.number_of_objects_started = 0
+        self.renders_done = 0
+        self.predicted_done = 0.0
+        self.actual_done = 0.0
+        self.build_started = time.time()
+
+        # Journal the whole plan up front, so --resume also knows about the
+        # jobs that were never started when a build is interrupted.
+        for job in self.plan:
+            if job["status"] != "existing":
+                self.log_queued(job)
+
+        if self.args.serve:
+            self.start_job_server()
 
         # Now do the real work...
-        self.enumerate_objects(count_only=False)
+        try:
+            self.execute_plan(self.plan)
+        finally:
+            self.stop_job_server()
+            self.save_render_caches()
+            self.write_build_reports()
+            self.close_journals()
+        self.compact_journals()
+
+        self.print_summary()
+
+    def load_cost_model(self):
+        model = CostModel()
+        for folder in self.get_output_folders():
+            model.add_journal(self.get_journal(folder))
+        return model
+
+    def predict_build_time(self):
+        renders = [j for j in self.plan if j["render"] and j["source"] is None]
+        known = [j["cost"] for j in renders if j["cost"] is not None]
+        if not known:
+            return None
+        # Objects with nothing to go on are assumed to be about average.
+        average = sum(known) / len(known)
+        for job in renders:
+            if job["cost"] is None:
+                job["cost"] = average
+        self.predicted_total = sum(j["cost"] for j in renders)
+        return get_makespan([j["cost"] for j in renders], self.args.jobs)
+
+    def schedule_by_cost(self, plan):
+        # Longest processing time first: the render workers take jobs in the
+        # order they are queued, so starting the most expensive objects first
+        # keeps the end of the build from waiting on one big tray.  Jobs that
+        # only slice or draw a thumbnail run in their own pools and go first,
+        # and copies follow the object they are copied from.  A copy of an
+        # object that is already built is made straight away, so it goes
+        # first as well.
+        renders = [j for j in plan if j["render"] and j["source"] is None]
+        estimates = {
+            id(j): 0.0 if j["fast_path"] else self.cost_model.estimate(j["cmd"])
+            for j in renders
+        }
+        renders.sort(key=lambda j: -estimates[id(j)])
+
+        copies = {}
+        schedule = []
+        for job in plan:
+            if not job["render"]:
+                schedule += [job]
+            elif job["source"] is not None:
+                if id(job["source"]) in estimates:
+                    copies.setdefault(id(job["source"]), [])
+                    copies[id(job["source"])] += [job]
+                else:
+                    schedule += [job]
+
+        for job in renders:
+            schedule += [job] + copies.get(id(job), [])
+        return schedule
+
+    def start_job_server(self):
+        self.job_server = JobServer(self.args.lease_time, self.report)
+        manager = make_job_manager(self.args.serve, self.args.authkey, self.job_server)
+        self.job_manager = manager.get_server()
+        self.job_manager.stop_event = threading.Event()
+        self.job_thread = threading.Thread(target=self.serve_jobs, daemon=True)
+        self.job_thread.start()
+        host, port = self.job_manager.address
+        print(f"Serving jobs to --worker processes on {host}:{port}")
+
+    def serve_jobs(self):
+        # Server.serve_forever() makes its own stop event and ends with
+        # sys.exit(), so run its accept loop against ours and return cleanly.
+        server = self.job_manager
+        threading.Thread(target=server.accepter, daemon=True).start()
+        server.stop_event.wait()
+
+    def stop_job_server(self):
+        if self.job_server is None:
+            return
+        self.job_server.close()
+        self.job_manager.stop_event.set()
+        self.job_thread.join()
+        self.job_server = None
+
+    def work(self):
+        # Run tools for a --serve coordinator until it is done.
+        manager = make_job_manager(self.args.worker, self.args.authkey)
+        try:
+            manager.connect()
+        except OSError as e:
+            sys.exit(f"Could not connect to the coordinator at {self.args.worker}: {e}")
+        print(f"Working for {self.args.worker} with {self.args.jobs} jobs")
+        workers = [
+            threading.Thread(target=self.work_loop, args=(manager.get_jobs(),))
+            for _ in range(self.args.jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        print("The coordinator has no more work, exiting.")
+
+    def work_loop(self, jobs):
+        try:
+            while True:
+                task = jobs.take()
+                if task is None:
+                    if jobs.closed():
+                        return
+                    continue
+                jobs.finish(task["id"], self.run_task(jobs, task))
+        except (EOFError, OSError):
+            # The coordinator has gone away.
+            return
+
+    def run_task(self, jobs, task):
+        done = threading.Event()
+
+        def renew_lease():
+            while not done.wait(task["lease_time"] / 4):
+                try:
+                    jobs.renew(task["id"])
+                except (EOFError, OSError):
+                    return
+
+        threading.Thread(target=renew_lease, daemon=True).start()
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                # Files keep their names, so a slicer that writes its gcode
+                # next to the model still writes one of the outputs.
+                paths = {}
+                for path, data in task["inputs"].items():
+                    paths[path] = os.path.join(folder, os.path.basename(path))
+                    with open(paths[path], "wb") as f:
+                        f.write(data)
+                for path in task["outputs"]:
+                    paths[path] = os.path.join(folder, os.path.basename(path))
+
+                cmd = [map_remote_arg(arg, paths) for arg in task["cmd"]]
+                if task["tool"] == "openscad":
+                    cmd[0] = self.config["openscad_exec"]
+                    cmd = self.map_backend_args(cmd)
+                else:
+                    cmd[0] = get_slice_cmd(cmd[-1])[0]
+                self.report([f"    Running: {' '.join(cmd)}"])
+                returncode, stdout, stderr, usage = self.run_process(
+                    cmd, task["low_priority"], task.get("timeout")
+                )
 
+                outputs = {}
+                for path in task["outputs"]:
+                    if os.path.exists(paths[path]):
+                        with open(paths[path], "rb") as f:
+                            outputs[path] = f.read()
+        finally:
+            done.set()
+
+        return {
+            "returncode": returncode,
+            "stdout": stdout,
+            "stderr": stderr,
+            "usage": usage,
+            "outputs": outputs,
+        }
+
+    def map_backend_args(self, cmd):
+        # The backend was picked for the coordinator's OpenSCAD, which may
+        # have options this worker's doesn't.
+        mapped = []
+        for arg in cmd:
+            if is_backend_arg(arg):
+                backend = "manifold" if "manifold" in arg.lower() else arg.split("=")[1]
+                mapped += self.resolve_backend(cmd[0], backend)
+            else:
+                mapped += [arg]
+        return mapped
+
+    def list_plan(self):
+        for job in self.plan:
+            steps = []
+            if job["render"]:
+                steps += ["copy" if job["source"] is not None else "render"]
+            if job["slice"]:
+                steps += ["slice"]
+            if job["thumbnail_cmd"] and job["source"] is None:
+                steps += ["thumbnail"]
+            print(f"{'+'.join(steps) or 'up to date':<24} {job['files']['model']}")
+
+    def count_jobs(self, jobs):
+        for job in jobs:
+            self.number_of_objects += 1
+            yield job
+
+    def print_summary(self):
         count_summary = (
             f"Number of objects declared:         {self.number_of_objects}\n"
         )
@@ -1325,48 +4382,111 @@ Use "-h" to get more help.'
         print(count_summary)
 
 
-oscad_variables = {"list": [], "options": {}}
+oscad_variables = {"names": set(), "options": {}}
 
 
-def get_oscad_variables():
-    global oscad_variables
+def get_suggestions(word, choices):
+    # Only needed when something is misspelled, so fuzzywuzzy (and the
+    # Levenshtein module it uses) are not imported until then.
+    from fuzzywuzzy import process
 
-    pattern = re.compile("(\w+)\s+=\s+.*;")
-    values = re.compile("(\w+)\s+=\s+.*;\s+//\s+(\[.*\])")
-    booleans = re.compile("(\w+)\s+=\s+(true|false);.*")
+    return process.extract(word, sorted(choices), limit=1)
 
-    with open("tray_generator.scad") as fp:
-        line = fp.readline()
-        while line:
-            try:
-                if "__Customizer_Limit__" in line:
-                    break
-                m = values.match(line)
-                if m and "," in m.group(2):
-                    try:
-                        optlist = json.loads(m.group(2))
-                        oscad_variables["list"] += [m.group(1)]
-                        oscad_variables["options"][m.group(1)] = m.group(2)
-                    except json.JSONDecodeError:
-                        oscad_variables["list"] += [m.group(1)]
-                        oscad_variables["options"][m.group(1)] = None
-                    continue
 
-                m = booleans.match(line)
-                if m:
-                    oscad_variables["list"] += [m.group(1)]
-                    oscad_variables["options"][m.group(1)] = ["true", "false"]
+def parse_oscad_variables(filename):
+    names = []
+    options = {}
+
+    pattern = re.compile(r"(\w+)\s+=\s+.*;")
+    values = re.compile(r"(\w+)\s+=\s+.*;\s+//\s+(\[.*\])")
+    booleans = re.compile(r"(\w+)\s+=\s+(true|false);.*")
+
+    with open(filename) as fp:
+        for line in fp:
+            if "__Customizer_Limit__" in line:
+                break
+            m = values.match(line)
+            if m and "," in m.group(2):
+                names += [m.group(1)]
+                try:
+                    optlist = json.loads(m.group(2))
+                except json.JSONDecodeError:
+                    options[m.group(1)] = None
                     continue
+                # Strings can be given with or without their quotes.
+                accepted = set()
+                for option in optlist:
+                    accepted.add(str(option))
+                    accepted.add(json.dumps(option))
+                options[m.group(1)] = sorted(accepted)
+                continue
 
-                m = pattern.match(line)
-                if m:
-                    oscad_variables["list"] += [m.group(1)]
-                    oscad_variables["options"][m.group(1)] = None
-            finally:
-                line = fp.readline()
+            m = booleans.match(line)
+            if m:
+                names += [m.group(1)]
+                options[m.group(1)] = ["true", "false"]
+                continue
+
+            m = pattern.match(line)
+            if m:
+                names += [m.group(1)]
+                options[m.group(1)] = None
+
+    return {"names": names, "options": options}
+
+
+def get_oscad_variables(filename="tray_generator.scad"):
+    global oscad_variables
+
+    # The index of the customizer variables is kept next to the scad file,
+    # and only rebuilt when the file has changed.
+    index_file = os.path.join(os.path.dirname(filename), ".tray_generator_index.json")
+    stat = os.stat(filename)
+    try:
+        with open(index_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    if cached.get("mtime") == stat.st_mtime and cached.get("size") == stat.st_size:
+        index = cached["index"]
+    else:
+        # It has been touched, so hash what is on disk now.
+        file_digests.pop(filename, None)
+        digest = get_file_digest(filename)
+        if cached.get("sha256") == digest:
+            index = cached["index"]
+        else:
+            index = parse_oscad_variables(filename)
+        try:
+            with open(f"{index_file}.tmp", "w") as f:
+                json.dump(
+                    {
+                        "mtime": stat.st_mtime,
+                        "size": stat.st_size,
+                        "sha256": digest,
+                        "index": index,
+                    },
+                    f,
+                )
+            os.replace(f"{index_file}.tmp", index_file)
+        except OSError:
+            # Nowhere to keep it, so it is rebuilt next time.
+            pass
+
+    oscad_variables = {
+        "names": set(index["names"]),
+        "options": {
+            name: set(options) if options is not None else None
+            for name, options in index["options"].items()
+        },
+    }
 
 
 if __name__ == "__main__":
     get_oscad_variables()
     maker = MakeTrays()
-    maker.make()
+    if maker.args.worker:
+        maker.work()
+    else:
+        maker.make()
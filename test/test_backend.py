@@ -0,0 +1,41 @@
+import os
+import make_trays
+
+
+def make_openscad(tmp_path, name, help):
+    openscad = tmp_path / name
+    openscad.write_text(f"#!/bin/sh\ncat >&2 <<EOF\n{help}\nEOF\n")
+    os.chmod(openscad, 0o755)
+    return str(openscad)
+
+
+def test_backend_args(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = make_openscad(
+        tmp_path, "new", "--backend arg  3D rendering backend: CGAL or Manifold"
+    )
+    enable = make_openscad(
+        tmp_path, "dev", "--enable arg  enable experimental features: roof | manifold"
+    )
+    release = make_openscad(tmp_path, "old", "--render arg  for full geometry")
+
+    assert make_trays.get_backend_args(backend, "manifold") == ["--backend=manifold"]
+    assert make_trays.get_backend_args(enable, "manifold") == ["--enable=manifold"]
+    assert make_trays.get_backend_args(release, "manifold") is None
+    assert make_trays.get_backend_args(release, "cgal") == []
+    assert make_trays.get_backend_args(release, "default") == []
+
+    # Asked once, and remembered for the next run.
+    os.remove(backend)
+    assert make_trays.get_backend_args(backend, "manifold") == ["--backend=manifold"]
+
+
+def test_backend_is_in_the_render_key(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pytest", "-o", str(tmp_path)])
+    maker = make_trays.MakeTrays()
+    cmd = ["openscad", "-D", 'Build_Mode="Tray_Lid"', "tray_generator.scad"]
+    fast = cmd[:1] + ["--backend=manifold"] + cmd[1:]
+    assert maker.get_render_key(fast) != maker.get_render_key(cmd)
+    assert make_trays.get_canonical_cmd(fast) != make_trays.get_canonical_cmd(cmd)
+    flags = cmd[:1] + ["--hardwarnings"] + cmd[1:]
+    assert maker.get_render_key(flags) != maker.get_render_key(cmd)
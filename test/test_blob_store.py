@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+import make_trays
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "reflink", "symlink"])
+def test_blob_store(tmp_path, mode):
+    folder = tmp_path / "out"
+    (folder / "a").mkdir(parents=True)
+    (folder / "b").mkdir()
+    first = folder / "a" / "tray.3mf"
+    second = folder / "b" / "tray.3mf"
+    other = folder / "b" / "other.3mf"
+    first.write_text("model")
+    second.write_text("model")
+    other.write_text("other model")
+
+    store = make_trays.BlobStore(str(folder), mode)
+    for filename in [first, second, other]:
+        store.add(str(filename))
+    blobs = [f for _, _, files in os.walk(folder / ".blobs") for f in files]
+    assert len(blobs) == 2
+    assert first.read_text() == second.read_text() == "model"
+    assert os.path.islink(first) == (mode == "symlink")
+
+    copy = folder / "b" / "copy.3mf"
+    assert store.copy(str(other), str(copy))
+    assert copy.read_text() == "other model"
+
+    # Only the blob nothing refers to any more is removed.
+    os.remove(first)
+    assert store.unreferenced() == []
+    os.remove(second)
+    assert store.clean() == (1, len("model"))
+    assert copy.read_text() == "other model"
+
+
+@pytest.mark.parametrize("mode", ["hardlink", "symlink"])
+def test_reslice_one_of_two_copies(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(
+        "sys.argv", ["pytest", "-o", str(tmp_path), "--link_mode", mode]
+    )
+    maker = make_trays.MakeTrays()
+    first = tmp_path / "a" / "tray.gcode"
+    second = tmp_path / "b" / "tray.gcode"
+    for gcode in [first, second]:
+        gcode.parent.mkdir()
+        gcode.write_text("gcode")
+        maker.store_output(str(tmp_path), str(gcode))
+
+    # A slicer that writes its gcode in place.
+    script = "import sys; open(sys.argv[1], 'w').write('resliced')"
+    proc, _, _ = maker.run_tool(
+        [sys.executable, "-c", script, str(first)], outputs=[str(first)]
+    )
+    assert proc.returncode == 0
+    assert first.read_text() == "resliced"
+    assert second.read_text() == "gcode"
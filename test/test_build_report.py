@@ -0,0 +1,67 @@
+import make_trays
+
+
+def test_openscad_time_formats():
+    assert make_trays.get_openscad_time("Total rendering time: 0:01:02.5\n") == 62.5
+    assert (
+        make_trays.get_openscad_time("Total rendering time: 1 hours, 0 minutes, 3 seconds")
+        == 3603
+    )
+    assert make_trays.get_openscad_time("Rendering finished.") is None
+
+
+def test_build_report_totals():
+    def timing(generator, mode, stage, wall):
+        return {
+            "model": f"{generator}_{mode}.3mf",
+            "generator": generator,
+            "build_mode": mode,
+            "stage": stage,
+            "ok": True,
+            "wall": wall,
+            "cpu": wall / 2,
+        }
+
+    report = make_trays.make_build_report(
+        [
+            timing("a", "Square_Cups", "render", 10.0),
+            timing("a", "Just_the_Tray", "render", 2.0),
+            timing("b", "Square_Cups", "render", 4.0),
+            timing("a", "Square_Cups", "slice", 3.0),
+        ],
+        20.0,
+    )
+    assert report["stages"]["render"]["wall"] == 16.0
+    assert report["stages"]["slice"]["wall"] == 3.0
+    assert report["generators"]["a"] == {"count": 2, "wall": 12.0, "cpu": 6.0}
+    assert report["build_modes"]["Square_Cups"]["count"] == 2
+    assert [t["wall"] for t in report["slowest"]] == [10.0, 4.0, 2.0]
+
+
+def test_cost_model_predictions():
+    def cmd(mode, length, width, *params):
+        return (
+            ["openscad", "-D", "Scale_Units=25.4"]
+            + ["-D", f"Tray_Length={length}", "-D", f"Tray_Width={width}"]
+            + ["-D", f"Tray_Height=1", "-D", f'Build_Mode="{mode}"']
+            + [arg for param in params for arg in ["-D", param]]
+        )
+
+    small = cmd("Square_Cups", 2, 2, "Square_Cup_Size=2")
+    divided = cmd("Square_Cups", 4, 4, "Square_Cup_Size=1")
+    assert make_trays.get_cost_features(divided)[2] == 16
+
+    model = make_trays.CostModel()
+    assert model.predict(small) is None
+    model.add(small, 2.0)
+    model.add(small, 4.0)
+    model.add(small, 3.0)
+    # Seen before, so its own history is used.
+    assert model.predict(small) == 3.0
+    # Not seen before, so scaled by the number of cups.
+    assert model.predict(divided) == 9 / 6 * 17
+    lw_cups = cmd(
+        "Length_Width_Cups", 4, 2, "Cup_Along_Length=4", "Cups_Across_Width=2"
+    )
+    assert make_trays.get_cost_features(lw_cups)[2] == 8
+    assert model.predict(lw_cups) == 9 / 6 * 9
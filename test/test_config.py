@@ -1,3 +1,4 @@
+import json
 import pytest
 import make_trays
 
@@ -58,3 +59,61 @@ def test_non_existent_config(non_existent_config):
         "Specified config file does not exist:")
 
 
+
+@pytest.fixture()
+def zero_jobs(monkeypatch):
+    monkeypatch.setattr(
+        "sys.argv", ["pytest", "-d", "-o", "testfolder", "--dimensions", "1x1x1", "-j", "0"])
+
+def test_zero_jobs(zero_jobs):
+    with pytest.raises(SystemExit) as e:
+        maker = make_trays.MakeTrays()
+    assert e.value.code == "The number of jobs (-j/--jobs) must be at least 1."
+
+
+@pytest.fixture()
+def inherited_config(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path),
+        "units": "cm",
+        "flat": True,
+        "generators": {
+            "inherits": {"dimensions": "4x2x1"},
+            "overrides": {"dimensions": "4x2x1", "units": "digit", "flat": False},
+        },
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+
+
+def test_generators_inherit_settings(inherited_config):
+    maker = make_trays.MakeTrays()
+    inherits, overrides = maker.generator_configs[1:]
+    assert inherits["unit_name"] == "cm"
+    assert inherits["flat"] == True
+    assert overrides["unit_name"] == "digit"
+    # Settings that are not set don't override the ones they inherit.
+    assert overrides["flat"] == True
+    # The merged layers are shared, so they can't be changed by accident.
+    with pytest.raises(TypeError):
+        maker.base_layer["units"] = "in"
+
+
+def test_merged_layers_are_converted(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path),
+        "lengths": "2 3",
+        "lid_styles": "recessed",
+        "generators": {"lists": {"widths": 1, "heights": "1"}},
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+    maker = make_trays.MakeTrays()
+    assert maker.base_layer["lengths"] == [2.0, 3.0]
+    assert maker.base_layer["lid_styles"] == ["recessed"]
+    lists = maker.generator_configs[1]
+    assert lists["lengths"] == [2.0, 3.0]
+    assert lists["widths"] == [1.0]
+    assert lists["heights"] == [1.0]
@@ -0,0 +1,155 @@
+import math
+import subprocess
+import pytest
+import make_trays
+
+np = pytest.importorskip("numpy")
+
+tray = [
+    "openscad",
+    "-D",
+    "Scale_Units=25.4",
+    "-D",
+    "Tray_Length=4",
+    "-D",
+    "Tray_Width=2",
+    "-D",
+    "Tray_Height=1",
+]
+
+
+def get_mesh(*settings):
+    cmd = list(tray)
+    for setting in settings:
+        cmd += ["-D", setting]
+    fast_tray = make_trays.get_fast_tray(cmd + ["tray_generator.scad"])
+    assert fast_tray is not None
+    return fast_tray, *fast_tray.get_mesh()
+
+
+def get_volume(vertices, faces):
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    return np.einsum("ij,ij->i", a, np.cross(b, c)).sum() / 6
+
+
+def check_closed(faces):
+    # Every edge is shared by exactly two triangles, which go along it in
+    # opposite directions.
+    edges = {}
+    for a, b, c in faces.tolist():
+        for edge in [(a, b), (b, c), (c, a)]:
+            edges[edge] = edges.get(edge, 0) + 1
+    assert set(edges.values()) == {1}
+    assert all((b, a) in edges for a, b in edges)
+
+
+def test_square_corners():
+    wall = floor = divider = 0.07 * 25.4
+    length, width, height = 4 * 25.4, 2 * 25.4, 25.4
+    cavity = (length - 2 * wall) * (width - 2 * wall)
+    tray_volume = length * width * height - cavity * (height - floor)
+
+    fast_tray, vertices, faces = get_mesh(
+        'Build_Mode="Just_the_Tray"', "Corner_Roundness=0"
+    )
+    check_closed(faces)
+    assert get_volume(vertices, faces) == pytest.approx(tray_volume)
+    assert vertices.min(0).tolist() == pytest.approx([-length / 2, -width / 2, 0])
+    assert vertices.max(0).tolist() == pytest.approx([length / 2, width / 2, height])
+
+    # One divider wall each way, a little lower than the walls.
+    fast_tray, vertices, faces = get_mesh(
+        'Build_Mode="Length_Width_Cups"',
+        "Cups_Along_Length=2",
+        "Cups_Across_Width=2",
+        "Corner_Roundness=0",
+    )
+    check_closed(faces)
+    dividers = divider * (width - 2 * wall) + divider * (length - 2 * wall - divider)
+    assert fast_tray.top == pytest.approx(height - 0.001)
+    assert get_volume(vertices, faces) == pytest.approx(
+        tray_volume + dividers * (fast_tray.top - floor)
+    )
+
+    # The stacking interlock underneath, and the dividers lowered for it.
+    interlock, gap = 0.069 * 25.4, 0.003 * 25.4
+    fast_tray, vertices, faces = get_mesh(
+        'Build_Mode="Length_Width_Cups"',
+        "Cups_Along_Length=2",
+        "Cups_Across_Width=2",
+        "Corner_Roundness=0",
+        "Interlock_Height=0.069",
+    )
+    check_closed(faces)
+    boss = (length - 2 * wall - gap) * (width - 2 * wall - gap) * (interlock - 0.001)
+    assert fast_tray.top == pytest.approx(height - interlock - 0.001)
+    assert get_volume(vertices, faces) == pytest.approx(
+        tray_volume + boss + dividers * (fast_tray.top - floor)
+    )
+    assert vertices[:, 2].min() == pytest.approx(0.001 - interlock)
+
+
+def test_round_corners():
+    # 20 facets to a circle: each corner loses the square around a quarter
+    # of the polygon, on the outside of the tray and on the inside.
+    radius = floor = 0.07 * 25.4
+    corner = radius ** 2 - 5 * radius ** 2 * math.sin(math.radians(18)) / 2
+    _, vertices, faces = get_mesh('Build_Mode="Just_the_Tray"', "Corner_Roundness=0")
+    square = get_volume(vertices, faces)
+    _, vertices, faces = get_mesh('Build_Mode="Just_the_Tray"')
+    check_closed(faces)
+    assert get_volume(vertices, faces) == pytest.approx(square - 4 * corner * floor)
+
+    _, vertices, faces = get_mesh(
+        'Build_Mode="Square_Cups"', "Square_Cup_Size=0.5", "Interlock_Height=0.069"
+    )
+    check_closed(faces)
+    assert len(faces) > 1000
+
+
+def test_needs_openscad():
+    cmd = tray + ["-D", 'Build_Mode="Length_Width_Cups"', "-D", "Cups_Along_Length=2"]
+    cmd += ["tray_generator.scad"]
+    assert make_trays.get_fast_tray(cmd) is not None
+    for setting in [
+        'Build_Mode="Tray_Lid"',
+        'Build_Mode="Custom_Ratio_Divisions"',
+        "Create_A_Lid=true",
+        "Make_Finger_Slots=true",
+        "Facet_Scale=0.5",
+        "Divider_Wall_Height_Scale=1.5",
+        "Tray_Height=Tray_Width",
+    ]:
+        assert make_trays.get_fast_tray(cmd[:-1] + ["-D", setting, cmd[-1]]) is None
+    assert make_trays.get_fast_tray(cmd[:-1] + ["-p", "x.json", cmd[-1]]) is None
+
+
+def test_same_as_openscad(tmp_path):
+    settings = [
+        'Build_Mode="Length_Width_Cups"',
+        "Cups_Along_Length=3",
+        "Cups_Across_Width=2",
+        "Interlock_Height=0.069",
+    ]
+    _, vertices, faces = get_mesh(*settings)
+    cmd = list(tray)
+    for setting in settings:
+        cmd += ["-D", setting]
+    model = tmp_path / "tray.stl"
+    try:
+        subprocess.run(
+            cmd + ["-o", str(model), "tray_generator.scad"], capture_output=True
+        )
+        triangles = make_trays.read_stl(str(model))
+    except OSError:
+        triangles = []
+    if not triangles:
+        pytest.skip("No OpenSCAD to compare with")
+    openscad = np.array(triangles)
+    volume = np.einsum(
+        "ij,ij->i", openscad[:, 0], np.cross(openscad[:, 1], openscad[:, 2])
+    ).sum() / 6
+    # STL stores single precision floats.
+    assert get_volume(vertices, faces) == pytest.approx(volume, rel=1e-4)
+    assert vertices.min(0) == pytest.approx(openscad.min((0, 1)), abs=1e-3)
+    assert vertices.max(0) == pytest.approx(openscad.max((0, 1)), abs=1e-3)
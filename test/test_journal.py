@@ -0,0 +1,74 @@
+import make_trays
+
+
+def queued(model, stages):
+    return {
+        "event": "queued",
+        "model": model,
+        "key": "abc",
+        "stages": stages,
+        "plan": {"files": {"model": model}},
+    }
+
+
+def done(model, stage, ok=True):
+    return {"event": "done", "model": model, "key": "abc", "stage": stage, "ok": ok}
+
+
+def test_journal_finds_unfinished_jobs(tmp_path):
+    journal = make_trays.BuildJournal(str(tmp_path))
+    journal.write(queued("finished.3mf", ["render", "thumbnail"]))
+    journal.write(queued("interrupted.3mf", ["render", "thumbnail"]))
+    journal.write(queued("failed.3mf", ["render"]))
+    journal.write(done("finished.3mf", "render"))
+    journal.write(done("finished.3mf", "thumbnail"))
+    journal.write(done("interrupted.3mf", "render"))
+    journal.write(done("failed.3mf", "render", ok=False))
+    # A line cut short by a killed build.
+    with open(journal.path, "a") as f:
+        f.write('{"event": "do')
+
+    unfinished = make_trays.BuildJournal(str(tmp_path)).unfinished()
+    assert sorted((job["files"]["model"], stages) for job, stages in unfinished) == [
+        ("failed.3mf", {"render"}),
+        ("interrupted.3mf", {"thumbnail"}),
+    ]
+
+
+def test_journal_uses_the_latest_run(tmp_path):
+    journal = make_trays.BuildJournal(str(tmp_path))
+    journal.write(queued("tray.3mf", ["render"]))
+    journal.write(done("tray.3mf", "render", ok=False))
+    journal.write(queued("tray.3mf", ["render"]))
+    journal.write(done("tray.3mf", "render"))
+    assert journal.unfinished() == []
+
+
+def test_journal_is_compacted(tmp_path):
+    journal = make_trays.BuildJournal(str(tmp_path))
+    for _ in range(3):
+        journal.write(queued("tray.3mf", ["render"]))
+        journal.write({"event": "start", "model": "tray.3mf", "key": "abc"})
+        journal.write(done("tray.3mf", "render"))
+    journal.write(queued("failed.3mf", ["render"]))
+    journal.write(done("failed.3mf", "render", ok=False))
+    journal.compact()
+    assert journal.read() == [
+        queued("tray.3mf", ["render"]),
+        done("tray.3mf", "render"),
+        queued("failed.3mf", ["render"]),
+        done("failed.3mf", "render", ok=False),
+    ]
+    # And it can be written to again.
+    journal.write(queued("tray.3mf", ["render"]))
+    assert len(journal.read()) == 5
+
+
+def test_outputs_appear_complete(tmp_path):
+    src = tmp_path / "tray.3mf"
+    dst = tmp_path / "copy.3mf"
+    src.write_text("model")
+    make_trays.link_output(str(src), str(dst))
+    assert dst.read_text() == "model"
+    assert not (tmp_path / "copy.partial.3mf").exists()
+    assert make_trays.partial_path("tray.3mf") == "tray.partial.3mf"
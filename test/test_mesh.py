@@ -0,0 +1,71 @@
+import make_trays
+
+cube = [
+    (0, 0, 0),
+    (9, 0, 0),
+    (9, 9, 0),
+    (0, 9, 0),
+    (0, 0, 9),
+    (9, 0, 9),
+    (9, 9, 9),
+    (0, 9, 9),
+]
+faces = [
+    (0, 2, 1),
+    (0, 3, 2),
+    (4, 5, 6),
+    (4, 6, 7),
+    (0, 1, 5),
+    (0, 5, 4),
+    (1, 2, 6),
+    (1, 6, 5),
+    (2, 3, 7),
+    (2, 7, 6),
+    (3, 0, 4),
+    (3, 4, 7),
+]
+
+
+def write_ascii_stl(filename):
+    lines = ["solid cube"]
+    for face in faces:
+        lines += ["facet normal 0 0 0", "outer loop"]
+        lines += [f"vertex {x} {y} {z}" for x, y, z in (cube[i] for i in face)]
+        lines += ["endloop", "endfacet"]
+    lines += ["endsolid cube"]
+    filename.write_text("\n".join(lines) + "\n")
+
+
+def test_compact_to_binary_stl(tmp_path):
+    stl = tmp_path / "cube.stl"
+    write_ascii_stl(stl)
+    before = stl.stat().st_size
+    triangles = make_trays.read_stl(str(stl))
+    assert make_trays.compact_model(str(stl), str(stl))
+    assert stl.stat().st_size < before
+    assert make_trays.read_stl(str(stl)) == triangles
+
+
+def test_compact_to_3mf(tmp_path):
+    stl = tmp_path / "cube.stl"
+    write_ascii_stl(stl)
+    model = tmp_path / "cube.3mf"
+    assert make_trays.compact_model(str(stl), str(model))
+    triangles = make_trays.read_3mf(str(model))
+    assert triangles == make_trays.read_stl(str(stl))
+    vertices, merged = make_trays.merge_vertices(triangles)
+    assert len(vertices) == 8 and len(merged) == 12
+    # Repacking a 3MF keeps the same mesh.
+    assert make_trays.compact_model(str(model), str(model))
+    assert make_trays.read_3mf(str(model)) == triangles
+
+
+def test_compact_keeps_a_smaller_export(tmp_path):
+    stl = tmp_path / "cube.stl"
+    write_ascii_stl(stl)
+    assert make_trays.compact_model(str(stl), str(stl))
+    compacted = stl.read_bytes()
+    # A second pass can't do better, so the file is left alone.
+    assert make_trays.compact_model(str(stl), str(stl))
+    assert stl.read_bytes() == compacted
+    assert not (tmp_path / make_trays.partial_path("cube.stl")).exists()
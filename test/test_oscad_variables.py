@@ -0,0 +1,24 @@
+import make_trays
+
+
+def test_variable_index(tmp_path):
+    scad = tmp_path / "tray.scad"
+    scad.write_text(
+        'Style = "Round"; // ["Round", "Square"]\n'
+        "Lid = true;\n"
+        "Height = 2; // [1:10]\n"
+        "__Customizer_Limit__ = 0;\n"
+        "Hidden = 1;\n"
+    )
+    make_trays.get_oscad_variables(str(scad))
+    variables = make_trays.oscad_variables
+    assert variables["names"] == {"Style", "Lid", "Height"}
+    assert {'"Round"', "Round"} <= variables["options"]["Style"]
+    assert variables["options"]["Lid"] == {"true", "false"}
+    assert variables["options"]["Height"] is None
+    assert (tmp_path / ".tray_generator_index.json").exists()
+
+    # The index is rebuilt when the file changes.
+    scad.write_text("Width = 3;\n")
+    make_trays.get_oscad_variables(str(scad))
+    assert make_trays.oscad_variables["names"] == {"Width"}
@@ -0,0 +1,235 @@
+import json
+import os
+import pytest
+import make_trays
+
+
+@pytest.fixture()
+def square_cups_config(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path / "out"),
+        "generators": {
+            "cups": {"dimensions": "4x2x1", "make_square_cups": True},
+        },
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+
+
+def test_plan_is_built_once(square_cups_config):
+    maker = make_trays.MakeTrays()
+    maker.make()
+    assert len(maker.plan) == 2
+    assert [job["files"]["model"] for job in maker.plan] == maker.result["models"]
+    for job in maker.plan:
+        assert job["render"]
+        assert job["status"] == "planned"
+        assert job["cmd"][-1] == "tray_generator.scad"
+
+
+@pytest.fixture()
+def duplicate_generators_config(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path / "out"),
+        "generators": {
+            "first": {"dimensions": "4x2x1", "make_square_cups": True},
+            "second": {
+                "dimensions": "4x2x1",
+                "make_square_cups": True,
+                "file_prefix": "copy_",
+            },
+        },
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+
+
+def test_duplicates_reuse_first_job(duplicate_generators_config):
+    maker = make_trays.MakeTrays()
+    maker.make()
+    assert len(maker.plan) == 4
+    first, second = maker.plan[:2], maker.plan[2:]
+    for original, copy in zip(first, second):
+        assert original["source"] is None
+        assert copy["source"] is original
+    assert maker.number_of_objects_total == 2
+
+
+def test_stream_keeps_only_what_dedup_needs(duplicate_generators_config, monkeypatch):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["--stream"])
+    maker = make_trays.MakeTrays()
+    maker.make()
+    assert maker.number_of_objects_generated == 4
+    assert len(maker.issued_cmds) == 2
+    for source in maker.issued_cmds.values():
+        assert source["copies"] is None
+        assert "cmd" not in source
+        assert source["files"]["model"].split("/")[-1].startswith("tray_")
+
+
+def test_thumbnails_are_a_separate_pass(square_cups_config):
+    maker = make_trays.MakeTrays()
+    maker.make()
+    job = maker.plan[0]
+    assert job["files"]["png"] not in job["cmd"]
+    assert job["thumbnail_cmd"][-1] == "thumbnail.scad"
+    assert "--imgsize=800,600" in job["thumbnail_cmd"]
+    assert job["thumbnail_cmd"][job["thumbnail_cmd"].index("-o") + 1] == job["files"]["png"]
+
+
+def test_preview_only_uses_preview_renderer(square_cups_config, monkeypatch):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["-p", "--thumbnail_size", "400x300"])
+    maker = make_trays.MakeTrays()
+    maker.make()
+    job = maker.plan[0]
+    assert "--preview" in job["cmd"]
+    assert "--imgsize=400,300" in job["cmd"]
+    assert job["files"]["model"] not in job["cmd"]
+    assert job["thumbnail_cmd"] is None
+
+
+@pytest.fixture()
+def lengths_sweep_config(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path / "out"),
+        "generators": {
+            "sweep": {"lengths": "2 4 6", "widths": "2 4", "heights": "1 2"},
+        },
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+
+
+def test_planning_doesnt_ask_openscad(square_cups_config, monkeypatch):
+    def ask_openscad(openscad_exec):
+        raise AssertionError("OpenSCAD was run while planning")
+
+    monkeypatch.setattr(make_trays, "ask_openscad", ask_openscad)
+    maker = make_trays.MakeTrays()
+    maker.make()
+    assert maker.config["backend_args"] == []
+    for job in maker.plan:
+        assert job["key"] is None
+        assert not job["fast_path"]
+
+
+def test_jobs_are_enumerated_lazily(lengths_sweep_config):
+    maker = make_trays.MakeTrays()
+    jobs = maker.enumerate_objects()
+    first = next(jobs)
+    assert first["files"]["model"].endswith("tray_2x2x1_in.3mf")
+    assert len(list(jobs)) == 9
+
+
+def test_cost_schedule_starts_biggest_first(duplicate_generators_config, monkeypatch):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["--schedule", "cost"])
+    maker = make_trays.MakeTrays()
+    maker.make()
+    # The 4x2 cups tray first, each followed by its copy from the second generator.
+    assert [job["files"]["model"].split("/")[-1] for job in maker.plan] == [
+        "tray_4x2x1_in_4x2_cups.3mf",
+        "copy_4x2x1_in_4x2_cups.3mf",
+        "tray_4x2x1_in_2x1_cups.3mf",
+        "copy_4x2x1_in_2x1_cups.3mf",
+    ]
+
+
+def test_longest_schedule_is_cost(duplicate_generators_config, monkeypatch):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["--schedule", "longest"])
+    maker = make_trays.MakeTrays()
+    assert maker.args.schedule == "cost"
+
+
+def test_cost_schedule_keeps_copies_of_built_objects(
+    duplicate_generators_config, monkeypatch
+):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["--schedule", "cost"])
+    maker = make_trays.MakeTrays()
+    maker.make()
+    # The first generator's models are already built, the copies are not.
+    for job in [job for job in maker.plan if job["source"] is None]:
+        os.makedirs(job["files"]["folder"], exist_ok=True)
+        with open(job["files"]["model"], "w") as f:
+            f.write("tray")
+
+    maker = make_trays.MakeTrays()
+    maker.make()
+    copies = [job for job in maker.plan if job["render"]]
+    assert sorted(job["files"]["model"].split("/")[-1] for job in copies) == [
+        "copy_4x2x1_in_2x1_cups.3mf",
+        "copy_4x2x1_in_4x2_cups.3mf",
+    ]
+    assert all(not job["source"]["render"] for job in copies)
+    assert sorted(maker.result["models"]) == sorted(
+        job["files"]["model"] for job in copies
+    )
+
+
+def test_makespan():
+    assert make_trays.get_makespan([4, 3, 2, 1], 2) == 5
+    assert make_trays.get_makespan([1, 2, 3, 4], 2) == 6
+    assert make_trays.get_makespan([4, 3, 2, 1], 1) == 10
+
+
+def test_list_plan(duplicate_generators_config, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", make_trays.sys.argv + ["--list_plan"])
+    maker = make_trays.MakeTrays()
+    maker.make()
+    lines = [l for l in capsys.readouterr().out.splitlines() if l.endswith(".3mf")]
+    assert [line.split()[0] for line in lines] == [
+        "render+thumbnail",
+        "render+thumbnail",
+        "copy",
+        "copy",
+    ]
+
+
+@pytest.fixture()
+def lids_config(monkeypatch, tmp_path):
+    config = {
+        "output_folder": str(tmp_path / "out"),
+        "generators": {
+            "trays": {"dimensions": "4x2x1 4x2x2", "make_lids": True},
+        },
+    }
+    filename = tmp_path / "config.json"
+    filename.write_text(json.dumps(config))
+    monkeypatch.setattr("sys.argv", ["pytest", "-d", "-c", str(filename)])
+
+
+def test_lids_are_planned_once(lids_config):
+    maker = make_trays.MakeTrays()
+    maker.make()
+    # The lids of a size are planned once, whatever the tray height.
+    models = [job["files"]["model"] for job in maker.plan]
+    lids = [model for model in models if "/tray_lid_" in model]
+    assert len(lids) == 3
+    assert len(maker.plan) == 5
+
+
+def test_canonical_cmd():
+    cmd = ["openscad", "-D", 'Build_Mode="Length_Width_Cups"']
+    wide = cmd + ["-D", "Tray_Length=2", "-D", "Tray_Width=4.0"]
+    wide += ["-D", "Cups_Along_Length=1", "-D", "Cups_Across_Width=3"]
+    long = cmd + ["-D", "Tray_Width=2.0", "-D", "Tray_Length=4"]
+    long += ["-D", "Cups_Along_Length=3", "-D", "Cups_Across_Width=1"]
+    assert make_trays.get_canonical_cmd(wide) == make_trays.get_canonical_cmd(long)
+    # Not when a lid is built alongside the tray.
+    lid = ["-D", "Create_A_Lid=true"]
+    assert make_trays.get_canonical_cmd(wide + lid) != make_trays.get_canonical_cmd(
+        long + lid
+    )
+    # Settings the scad file doesn't read don't matter.
+    assert make_trays.get_canonical_cmd(
+        long + ["-D", "No_Such_Setting=1"]
+    ) == make_trays.get_canonical_cmd(long)
+
+    # A square tray with the cups swapped round is the same object too.
+    square = cmd + ["-D", "Tray_Length=4", "-D", "Tray_Width=4"]
+    turned = square + ["-D", "Cups_Along_Length=1", "-D", "Cups_Across_Width=2"]
+    square += ["-D", "Cups_Along_Length=2", "-D", "Cups_Across_Width=1"]
+    assert make_trays.get_canonical_cmd(square) == make_trays.get_canonical_cmd(turned)
+    assert make_trays.get_canonical_cmd(square) != make_trays.get_canonical_cmd(wide)
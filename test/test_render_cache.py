@@ -0,0 +1,64 @@
+import make_trays
+
+
+def test_render_cache_round_trip(tmp_path):
+    folder = str(tmp_path)
+    model = f"{folder}/4-in-L/tray_4x2x1.3mf"
+
+    cache = make_trays.RenderCache(folder)
+    assert cache.lookup(model) is None
+    cache.record(model, "abc")
+    cache.save()
+
+    cache = make_trays.RenderCache(folder)
+    assert cache.lookup(model) == "abc"
+
+
+def test_render_cache_finds_other_models(tmp_path):
+    folder = str(tmp_path)
+    first = f"{folder}/tray_4x2x1.3mf"
+    second = f"{folder}/other_4x2x1.3mf"
+
+    cache = make_trays.RenderCache(folder)
+    cache.record(first, "abc")
+    # Not on disk yet, so there is nothing to reuse.
+    assert cache.find("abc", second) is None
+
+    with open(first, "w") as f:
+        f.write("model")
+    assert cache.find("abc", second) == first
+    assert cache.find("abc", first) is None
+
+
+def test_scad_dependencies(tmp_path):
+    scad = tmp_path / "tray.scad"
+    source = (
+        'Build_Mode = "Tray";\n'
+        "Lid = false;\n"
+        "Width = 2;\n"
+        "Lid_Gap = 1;\n"
+        "module make_tray() { cube(Width); }\n"
+        "module make_lid() { cube(Width + Lid_Gap); }\n"
+        'if (Build_Mode == "Tray") { make_tray(); }\n'
+        'else if (Build_Mode == "Lid") { make_lid(); }\n'
+        'if (Build_Mode != "Lid" && Lid == true) { make_lid(); }\n'
+    )
+    scad.write_text(source)
+    deps = make_trays.ScadDependencies(str(scad))
+    tray = {"Build_Mode": '"Tray"'}
+    lid = {"Build_Mode": '"Lid"'}
+    parts, names, digest = deps.get_closure(tray)
+    assert "make_tray" in names and "make_lid" not in names
+    assert "Lid_Gap" not in names
+    assert deps.get_digest(tray) == digest
+    assert "make_lid" in deps.get_closure({**tray, "Lid": "true"})[1]
+
+    # Editing the lid leaves the tray alone.
+    scad.write_text(source.replace("Width + Lid_Gap", "Width * Lid_Gap"))
+    edited = make_trays.ScadDependencies(str(scad))
+    assert edited.get_digest(tray) == deps.get_digest(tray)
+    assert edited.get_digest(lid) != deps.get_digest(lid)
+
+    # Anything pulled in from elsewhere can't be followed.
+    scad.write_text("include <other.scad>\n" + source)
+    assert make_trays.ScadDependencies(str(scad)).get_closure(tray) is None
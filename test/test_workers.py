@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import time
+import pytest
+import make_trays
+
+
+def test_lease_is_handed_out_again():
+    server = make_trays.JobServer(lease_time=0.1, report=lambda lines: None)
+    results = []
+    coordinator = threading.Thread(
+        target=lambda: results.append(server.run({"cmd": ["openscad"]}))
+    )
+    coordinator.start()
+    first = server.take(wait=5)
+    assert first["cmd"] == ["openscad"]
+    # That worker dies without finishing, so the next one gets the same task.
+    second = server.take(wait=5)
+    assert second["id"] == first["id"]
+    assert server.finish(second["id"], "done")
+    coordinator.join()
+    assert results == ["done"]
+    # A late result from the first worker is ignored.
+    assert not server.finish(first["id"], "late")
+
+
+def test_local_workers(tmp_path, monkeypatch):
+    model = tmp_path / "tray.txt"
+    model.write_text("tray")
+    output = tmp_path / "out" / "tray.upper.txt"
+    output.parent.mkdir()
+
+    authkey = ["--authkey", "test"]
+    monkeypatch.setattr(
+        "sys.argv", ["pytest", "-o", str(tmp_path), "--serve", "127.0.0.1:0"] + authkey
+    )
+    coordinator = make_trays.MakeTrays()
+    coordinator.start_job_server()
+    host, port = coordinator.job_manager.address
+
+    workers = []
+    for _ in range(2):
+        monkeypatch.setattr(
+            "sys.argv", ["pytest", "--worker", f"{host}:{port}", "-j", "2"] + authkey
+        )
+        worker = make_trays.MakeTrays()
+        worker.config["openscad_exec"] = sys.executable
+        workers += [threading.Thread(target=worker.work)]
+        workers[-1].start()
+
+    # Stands in for OpenSCAD: reads the input and writes its -o output.
+    script = "import sys; open(sys.argv[2], 'w').write(open(sys.argv[3]).read().upper())"
+    try:
+        for _ in range(4):
+            proc, _, usage = coordinator.run_tool(
+                ["openscad", "-c", script, "-o", str(output), str(model)]
+            )
+            assert proc.returncode == 0
+            assert output.read_text() == "TRAY"
+            assert "wall" in usage
+            output.unlink()
+    finally:
+        coordinator.stop_job_server()
+    for worker in workers:
+        worker.join(timeout=10)
+        assert not worker.is_alive()
+
+
+def test_unexpected_outputs_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pytest", "-o", str(tmp_path)])
+    coordinator = make_trays.MakeTrays()
+    output, other = tmp_path / "tray.stl", tmp_path / "other.txt"
+    other.write_text("keep")
+
+    class Server:
+        def run(self, task):
+            outputs = {str(output): b"solid", str(other): b"overwritten"}
+            result = {"stdout": "", "stderr": "", "usage": {}, "outputs": outputs}
+            return dict(result, returncode=0)
+
+    coordinator.job_server = Server()
+    proc, _, _ = coordinator.run_tool(["openscad", "-o", str(output), "tray.scad"])
+    assert proc.returncode != 0
+    assert output.read_bytes() == b"solid"
+    assert other.read_text() == "keep"
+
+
+def test_authkey_is_required(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pytest", "--serve", "127.0.0.1:0"])
+    with pytest.raises(SystemExit):
+        make_trays.MakeTrays()
+
+
+def test_timeout_kills_the_process_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pytest", "-o", str(tmp_path)])
+    maker = make_trays.MakeTrays()
+    marker = tmp_path / "child_finished"
+    # The child would outlive its parent if only the parent were killed.
+    child = f"import time; time.sleep(2); open({str(marker)!r}, 'w')"
+    script = (
+        "import subprocess, sys, time;"
+        f"subprocess.Popen([sys.executable, '-c', {child!r}]);"
+        "time.sleep(30)"
+    )
+    returncode, _, stderr, usage = maker.run_process(
+        [sys.executable, "-c", script], timeout=0.5
+    )
+    assert returncode != 0
+    assert usage["timed_out"]
+    assert usage["wall"] < 10
+    assert "time limit" in stderr
+    time.sleep(2.5)
+    assert not marker.exists()
+
+
+def test_timeout_without_waitid(tmp_path, monkeypatch):
+    # As on macOS, where the process is reaped by polling.
+    monkeypatch.setattr("sys.argv", ["pytest", "-o", str(tmp_path)])
+    monkeypatch.delattr(os, "waitid", raising=False)
+    maker = make_trays.MakeTrays()
+    returncode, stdout, _, usage = maker.run_process(
+        [sys.executable, "-c", "print('done')"], timeout=5
+    )
+    assert returncode == 0
+    assert stdout == "done\n"
+    assert not usage.get("timed_out")
+    returncode, _, stderr, usage = maker.run_process(
+        [sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5
+    )
+    assert returncode != 0
+    assert usage["timed_out"]
+    assert "time limit" in stderr